@@ -1,38 +1,44 @@
-from typing import Dict, Any
+import json
+from functools import lru_cache
+from typing import Dict, Any, FrozenSet, List, Optional, Tuple
+from config import PROMPT_TOKEN_BUDGET
+from analyzers.response_parser import KPI_SECTIONS
+from analyzers.tokenizer import count_tokens, tokenizer_name
 from utils.detectors import calculate_response_time, pre_check_callback, pre_check_verification, pre_check_reason_identification, pre_check_interaction, pre_check_time_respect, pre_check_needs, pre_check_transfer
+from utils.masker import TokenMasker
+from utils.parsers import TURN_PATTERN, ParsedTranscript, parse_transcript
+from utils.rules import CALLBACK_ASK_RULES, turn_hits
 
-def build_smart_prompt(transcript: str) -> str:
-    time_data = calculate_response_time(transcript)
-    callback_flag = pre_check_callback(transcript)
-    verif_data = pre_check_verification(transcript)
-    reason_data = pre_check_reason_identification(transcript)
-    interaction_data = pre_check_interaction(transcript)
-    time_respect_data = pre_check_time_respect(transcript)
-    needs_data = pre_check_needs(transcript)
-    transfer_data = pre_check_transfer(transcript)
-    
-    return f"""You are a strict QA analyst for customer service chats. Analyze the ENTIRE transcript following these EXACT rules. Use pre-calculated data for objectivity.
-
-PRE-CALCULATED DATA (do not override):
-- System message at: {time_data['system_time_seconds']} seconds
-- First agent response at: {time_data['first_agent_time_seconds']} seconds
-- Response time: {time_data['response_time_seconds']} seconds
-- Within 2 minutes: {time_data['within_2_minutes']}
-- Agent identifier: {time_data['first_agent_identifier']}
-- Callback obtained (asked by agent or provided by customer in ANY msg, including abbrevs like 'cbr' for callback): {callback_flag}
-- Verification pre-check: Asked phone: {verif_data['asked_phone']}, Account: {verif_data['asked_account']}, Name: {verif_data['asked_name']}, Address: {verif_data['asked_address']}; Num asked: {verif_data['num_asked']}/3; Customer provided all via combo: {verif_data['all_obtained']}; Tech pre-supplied: {verif_data['tech_pre_supplied']}
-- Reason pre-check: Identified reason: {reason_data['identified_reason']}; Issue resolved in chat: {reason_data['issue_resolved']}; Requirement met: {reason_data['requirement_met']}; Detected issue: {reason_data['detected_issue'] or 'None'}
-- Interaction pre-check: Proper language: {interaction_data['proper_language']}; Appropriate tone: {interaction_data['appropriate_tone']}; Accepts responsibility: {interaction_data['accepts_responsibility']}; Responsibility context present: {interaction_data['responsibility_context_present']}; Sets expectation: {interaction_data['sets_expectation']}; Core requirements met: {interaction_data['core_requirements_met']}; Responsibility met: {interaction_data['responsibility_met']}; All met: {interaction_data['all_met']}
-- Time respect pre-check: Check-ins met: {time_respect_data['check_ins_met']}; No idle: {time_respect_data['no_idle']}; All met: {time_respect_data['all_met']}
-- Needs pre-check: No redundant ask: {needs_data['no_redundant_ask']}
-- Transfer pre-check: Asked voice services: {transfer_data['asked_voice']}
-
-RULES (STRICT - no leniency):
-1. FIRST RESPONSE TIME (5 points):
-   - Must respond within 120 seconds AND obtain CBR (asked by agent or provided by customer) using ONE of these exact/similar phrases in ANY agent message or customer provision: "Could you please provide a contact number in case we get disconnected?", "May I have a callback number in case we get disconnected?", "Please provide a phone number in case we lose connection", "may i have your cbr please", or variants like "call back number" implying disconnection safety, or customer gives phone number.
-   - Scoring: 5 = within 2min + CBR obtained (anywhere, asked or provided, per pre-check); 0 = neither or only one.
+# Bump whenever the prompt wording or JSON structure changes; part of the analysis cache key
+PROMPT_TEMPLATE_VERSION = "5"
+
+# Repeats of a message at least this long are sent as a back-reference instead of verbatim
+REPEAT_MIN_CHARS = 40
+
+# Detector rules whose hits make a turn relevant to one KPI's sub-prompt; None sends every turn
+# (check-ins and idle time are judged from the gaps between all timestamps)
+SECTION_RULES: Dict[str, Optional[FrozenSet[str]]] = {
+    'first_response_analysis': frozenset(CALLBACK_ASK_RULES + ('callback_provided',)),
+    'security_verification_analysis': frozenset({'ask_account', 'ask_phone', 'ask_name', 'ask_address', 'provided_account',
+                                                 'provided_phone', 'provided_name', 'provided_address', 'confirm_yes'}),
+    'customer_needs_analysis': frozenset({'reason_ask', 'specific_issue', 'resolution'}),
+    'interaction_analysis': frozenset({'tone_polite', 'tone_negative', 'sets_expectation', 'accepts_responsibility', 'responsibility_context'}),
+    'time_respect_analysis': None,
+    'needs_identification_analysis': frozenset({'info_provided', 'info_request'}),
+    'transfer_analysis': frozenset({'voice_services_ask'})
+}
 
-2. ACCOUNT VERIFICATION (10 points):
+# Instructions shared by every analysis. They go first, in the system message, so the provider can
+# cache them as a common prefix; everything that varies per transcript follows in the user message.
+# Each KPI's rule and JSON structure are kept apart so a sub-prompt's system message carries only its own.
+SYSTEM_PROMPT_INTRO = """You are a strict QA analyst for customer service chats. Analyze the ENTIRE transcript following these EXACT rules. Use the pre-calculated data given with each transcript for objectivity."""
+SECTION_PROMPT_INTRO = """You are a strict QA analyst for customer service chats. Score ONE KPI of the transcript following this EXACT rule. Use the pre-calculated data given with the transcript for objectivity."""
+
+SECTION_RULE_TEXT: Dict[str, str] = {
+    'first_response_analysis': """1. FIRST RESPONSE TIME (5 points):
+   - Must respond within 120 seconds AND obtain CBR (asked by agent or provided by customer) using ONE of these exact/similar phrases in ANY agent message or customer provision: "Could you please provide a contact number in case we get disconnected?", "May I have a callback number in case we get disconnected?", "Please provide a phone number in case we lose connection", "may i have your cbr please", or variants like "call back number" implying disconnection safety, or customer gives phone number.
+   - Scoring: 5 = within 2min + CBR obtained (anywhere, asked or provided, per pre-check); 0 = neither or only one.""",
+    'security_verification_analysis': """2. ACCOUNT VERIFICATION (10 points):
    - Ensure the record accessed aligns with the information given by the contact (no mismatches or guesses; confirm alignment via provisions/confirmations).
    - Obtain ONE of these combos (asked by agent or provided by technician/customer): (Name on Account + Service Address + Telephone Number) OR (Name on Account + Service Address + Account Number).
    - If not pre-supplied (check pre-supply flag), agent must ASK using phrasing close to: "Could you please provide the customer's account number or telephone number, and the name and address associated with the account?"
@@ -40,15 +46,13 @@ RULES (STRICT - no leniency):
    - CRITICAL: If not pre-supplied, agent must ASK (don't assume). No credit if agent provides/guesses info without ask. Use EXACT phrasing or very close if asked.
    - Acceptable customer info: Account # (e.g., 12345678), Telephone # (e.g., 555-1234 or 10-digit), Name (e.g., John Smith or FARMERS MUTUAL INSURANCE ASSN), Address (e.g., 123 Main St, City, State, Zip), or 'Yes' confirming agent-provided name/address.
    - Scoring: 10 = Combo obtained (asked or provided) + customer provided all in combo (including via 'Yes') + record aligns; 0 = Any failure (e.g., missing combo, mismatch, improper phrasing if asked).
-   - IMPORTANT: If pre-check shows all provided and pre-supplied true, score 10 if alignment confirmed.
-
-3. CUSTOMER EXPECTATIONS AND NEEDS (5 points):
+   - IMPORTANT: If pre-check shows all provided and pre-supplied true, score 10 if alignment confirmed.""",
+    'customer_needs_analysis': """3. CUSTOMER EXPECTATIONS AND NEEDS (5 points):
    - Identify the reason for the contact (e.g., No dial tone, bad pin, no MSS record, customer doesn't have IP, etc.).
    - The issue must be resolved during the chat (either by agent actions or technician providing solution).
    - NO NEED for agent to demonstrate understanding through restatement if the problem gets fixed.
-   - Scoring: 5 = Reason identified + Issue resolved in chat; 0 = Missing identification OR issue not resolved.
-
-4. CUSTOMER INTERACTION AND ACCEPTING RESPONSIBILITY (5 points):
+   - Scoring: 5 = Reason identified + Issue resolved in chat; 0 = Missing identification OR issue not resolved.""",
+    'interaction_analysis': """4. CUSTOMER INTERACTION AND ACCEPTING RESPONSIBILITY (5 points):
    - Use appropriate verbiage/tone during contact (MUST - no slang, profanity, or negative language).
    - Accept responsibility ONLY WHERE APPLICABLE (when company/department errors are mentioned in conversation).
    - Setting expectations is RECOMMENDED but NOT REQUIRED for scoring.
@@ -58,57 +62,51 @@ RULES (STRICT - no leniency):
      - If no responsibility context exists, agent gets full 5 points for appropriate tone/language
    - Scoring: 
        5 = Appropriate tone/language + (Accepts responsibility IF context exists)
-       0 = Inappropriate tone/language OR (responsibility context exists AND agent doesn't accept responsibility)
-
-5. CUSTOMER EXPERIENCE/ RESPECTFUL OF CUSTOMER'S TIME (10 points):
+       0 = Inappropriate tone/language OR (responsibility context exists AND agent doesn't accept responsibility)""",
+    'time_respect_analysis': """5. CUSTOMER EXPERIENCE/ RESPECTFUL OF CUSTOMER'S TIME (10 points):
    - Check in with the tech every 5 minutes on chat and 3 minutes on call. Maintain control of the chat/call and guide the conversation. TAC Agent should refrain from distracting activities and should not sit idle without reason for over 5 minute.
-   - Scoring: 10 = All met per pre-check (check-ins met, no idle); 0 = Any failure.
-
-6. IDENTIFY CONTACT'S NEEDS AND AVOID REDUNDANT ASKS (5 points):
+   - Scoring: 10 = All met per pre-check (check-ins met, no idle); 0 = Any failure.""",
+    'needs_identification_analysis': """6. IDENTIFY CONTACT'S NEEDS AND AVOID REDUNDANT ASKS (5 points):
    - Identify the contact's needs and avoid asking for information that has been provided in the transcript, chat history, or accessible on the account. Have efficient chat/call flow. Avoid repeating information that the contact already understands.
-   - Scoring: 5 = No redundant asks per pre-check; 0 = Any failure.
-
-7. PROPER TRANSFER/VOICE SERVICES QUESTION (10 points):
+   - Scoring: 5 = No redundant asks per pre-check; 0 = Any failure.""",
+    'transfer_analysis': """7. PROPER TRANSFER/VOICE SERVICES QUESTION (10 points):
    - Agent must ask about voice services provisioning using phrases like: "Do you need any voice services provisioned?", "voice services provisioned", or "provision voice services".
-   - Scoring: 10 = Asked voice services question; 0 = Not asked.
+   - Scoring: 10 = Asked voice services question; 0 = Not asked."""
+}
 
-ENFORCEMENT:
-- Base on pre-checks but refine if nuances (e.g., 'Yes' confirmations, 10-digit phone as account).
+ENFORCEMENT = """- Base on pre-checks but refine if nuances (e.g., 'Yes' confirmations, 10-digit phone as account).
 - If reason is identified and chat shows problem is fixed (by agent OR technician), give full marks.
 - If no responsibility context exists in conversation, don't penalize for lack of responsibility acceptance.
 - Reasoning must explain matches to rules/phrases.
 - Use EXACT key names as in the structure (e.g., 'within_2_minutes', not 'response_within_2_minutes').
+- Personal data is masked with numbered placeholders (e.g., [PHONE_1], [NAME_1]); quote placeholders exactly as written."""
 
-TRANSCRIPT:
-{transcript}
-
-Respond with ONLY valid JSON in this EXACT structure (no extra text):
-{{
-  "first_response_analysis": {{
-    "response_time_seconds": {time_data['response_time_seconds']},
-    "within_2_minutes": {str(time_data['within_2_minutes']).lower()},
+SECTION_STRUCTURE: Dict[str, str] = {
+    'first_response_analysis': """  "first_response_analysis": {
+    "response_time_seconds": number or null (the pre-calculated response time),
+    "within_2_minutes": true or false (the pre-calculated value),
     "callback_requested": "true or false based on transcript and pre-check",
     "score": number (0 or 5),
     "max_score": 5,
     "reasoning": "Brief explanation with phrase evidence"
-  }},
-  "security_verification_analysis": {{
+  }""",
+    'security_verification_analysis': """  "security_verification_analysis": {
     "agent_asked_for_combo": "true or false",
-    "num_elements_asked": {verif_data['num_asked']},
+    "num_elements_asked": number (the pre-calculated num asked),
     "customer_provided_all": "true or false",
     "record_aligned": "true or false",
     "score": number (0 or 10),
     "max_score": 10,
     "reasoning": "Brief explanation with detected asks/provisions, combo used, phrasing match, and alignment"
-  }},
-  "customer_needs_analysis": {{
+  }""",
+    'customer_needs_analysis': """  "customer_needs_analysis": {
     "identified_reason": "true or false",
     "issue_resolved": "true or false",
     "score": number (0 or 5),
     "max_score": 5,
     "reasoning": "Brief explanation with identified reason and resolution evidence"
-  }},
-  "interaction_analysis": {{
+  }""",
+    'interaction_analysis': """  "interaction_analysis": {
     "appropriate_tone": "true or false",
     "accepts_responsibility": "true or false",
     "responsibility_context_present": "true or false",
@@ -116,29 +114,269 @@ Respond with ONLY valid JSON in this EXACT structure (no extra text):
     "score": number (0 or 5),
     "max_score": 5,
     "reasoning": "Brief explanation with tone evidence and responsibility context analysis"
-  }},
-  "time_respect_analysis": {{
+  }""",
+    'time_respect_analysis': """  "time_respect_analysis": {
     "check_ins_met": "true or false",
     "no_idle": "true or false",
     "score": number (0 or 10),
     "max_score": 10,
     "reasoning": "Brief explanation with timestamp evidence"
-  }},
-  "needs_identification_analysis": {{
+  }""",
+    'needs_identification_analysis': """  "needs_identification_analysis": {
     "no_redundant_ask": "true or false",
     "score": number (0 or 5),
     "max_score": 5,
     "reasoning": "Brief explanation with evidence"
-  }},
-  "transfer_analysis": {{
+  }""",
+    'transfer_analysis': """  "transfer_analysis": {
     "asked_voice_services": "true or false",
     "score": number (0 or 10),
     "max_score": 10,
     "reasoning": "Brief explanation with phrase evidence"
-  }},
-  "overall_scores": {{
+  }"""
+}
+
+OVERALL_STRUCTURE = """  "overall_scores": {
     "total_score": sum of all,
     "max_possible_score": 45,
     "percentage_score": (total / 45 * 100) rounded to nearest int
-  }}
-}}"""
\ No newline at end of file
+  }"""
+
+def _system_prompt(intro: str, heading: str, rules: str, structure: str) -> str:
+    return f"""{intro}
+
+{heading} (STRICT - no leniency):
+{rules}
+
+ENFORCEMENT:
+{ENFORCEMENT}
+
+Respond with ONLY valid JSON in this EXACT structure (no extra text):
+{{
+{structure}
+}}"""
+
+SYSTEM_PROMPT = _system_prompt(SYSTEM_PROMPT_INTRO, "RULES", '\n\n'.join(SECTION_RULE_TEXT.values()),
+                               ',\n'.join([*SECTION_STRUCTURE.values(), OVERALL_STRUCTURE]))
+
+# System message of one KPI's sub-prompt (LLM_SECTION_PROMPTS): that KPI's rule and structure only
+SECTION_SYSTEM_PROMPTS: Dict[str, str] = {
+    section: _system_prompt(SECTION_PROMPT_INTRO, "RULE", SECTION_RULE_TEXT[section], SECTION_STRUCTURE[section])
+    for section in KPI_SECTIONS
+}
+
+def _pre_calculated(parsed: ParsedTranscript, mask) -> List[Tuple[str, str]]:
+    """(KPI section, line) pairs of the PRE-CALCULATED DATA block, in prompt order."""
+    time_data = calculate_response_time(parsed)
+    callback_flag = pre_check_callback(parsed)
+    verif_data = pre_check_verification(parsed)
+    reason_data = pre_check_reason_identification(parsed)
+    interaction_data = pre_check_interaction(parsed)
+    time_respect_data = pre_check_time_respect(parsed)
+    needs_data = pre_check_needs(parsed)
+    transfer_data = pre_check_transfer(parsed)
+    
+    return [
+        ('first_response_analysis', f"- System message at: {time_data['system_time_seconds']} seconds"),
+        ('first_response_analysis', f"- First agent response at: {time_data['first_agent_time_seconds']} seconds"),
+        ('first_response_analysis', f"- Response time: {time_data['response_time_seconds']} seconds"),
+        ('first_response_analysis', f"- Within 2 minutes: {time_data['within_2_minutes']}"),
+        ('first_response_analysis', f"- Agent identifier: {mask(str(time_data['first_agent_identifier']))}"),
+        ('first_response_analysis', f"- Callback obtained (asked by agent or provided by customer in ANY msg, including abbrevs like 'cbr' for callback): {callback_flag}"),
+        ('security_verification_analysis', f"- Verification pre-check: Asked phone: {verif_data['asked_phone']}, Account: {verif_data['asked_account']}, Name: {verif_data['asked_name']}, Address: {verif_data['asked_address']}; Num asked: {verif_data['num_asked']}/3; Customer provided all via combo: {verif_data['all_obtained']}; Tech pre-supplied: {verif_data['tech_pre_supplied']}"),
+        ('customer_needs_analysis', f"- Reason pre-check: Identified reason: {reason_data['identified_reason']}; Issue resolved in chat: {reason_data['issue_resolved']}; Requirement met: {reason_data['requirement_met']}; Detected issue: {mask(reason_data['detected_issue'] or 'None')}"),
+        ('interaction_analysis', f"- Interaction pre-check: Proper language: {interaction_data['proper_language']}; Appropriate tone: {interaction_data['appropriate_tone']}; Accepts responsibility: {interaction_data['accepts_responsibility']}; Responsibility context present: {interaction_data['responsibility_context_present']}; Sets expectation: {interaction_data['sets_expectation']}; Core requirements met: {interaction_data['core_requirements_met']}; Responsibility met: {interaction_data['responsibility_met']}; All met: {interaction_data['all_met']}"),
+        ('time_respect_analysis', f"- Time respect pre-check: Check-ins met: {time_respect_data['check_ins_met']}; No idle: {time_respect_data['no_idle']}; All met: {time_respect_data['all_met']}"),
+        ('needs_identification_analysis', f"- Needs pre-check: No redundant ask: {needs_data['no_redundant_ask']}"),
+        ('transfer_analysis', f"- Transfer pre-check: Asked voice services: {transfer_data['asked_voice']}")
+    ]
+
+def _exact_values(parsed: ParsedTranscript) -> Dict[str, str]:
+    """Pre-calculated fields the LLM must echo verbatim, by section."""
+    time_data = calculate_response_time(parsed)
+    verif_data = pre_check_verification(parsed)
+    return {
+        'first_response_analysis': f"response_time_seconds {json.dumps(time_data['response_time_seconds'])}, within_2_minutes {str(time_data['within_2_minutes']).lower()}",
+        'security_verification_analysis': f"num_elements_asked {verif_data['num_asked']}"
+    }
+
+def build_smart_prompt(transcript: str, parsed: Optional[ParsedTranscript] = None, masker: Optional[TokenMasker] = None) -> str:
+    # The per-transcript user message that follows SYSTEM_PROMPT.
+    # Detectors run on the already-parsed transcript when given; `transcript` is the text embedded in the prompt.
+    # Detector output quoting the raw transcript goes through the transcript's masker so no PII reaches the prompt.
+    parsed = parsed or parse_transcript(transcript)
+    mask = masker.mask if masker else str
+    pre_calculated = '\n'.join(line for _, line in _pre_calculated(parsed, mask))
+    exact = _exact_values(parsed)
+    
+    return f"""PRE-CALCULATED DATA (do not override):
+{pre_calculated}
+
+TRANSCRIPT:
+{transcript}
+
+Respond with ONLY valid JSON in the EXACT structure from your instructions (no extra text). Use {exact['first_response_analysis']} and {exact['security_verification_analysis']}."""
+
+def build_section_prompt(section: str, transcript: str, parsed: ParsedTranscript, masker: Optional[TokenMasker] = None) -> str:
+    """User message for one KPI scored on its own: that KPI's pre-checks and relevant turns only."""
+    mask = masker.mask if masker else str
+    pre_calculated = '\n'.join(line for key, line in _pre_calculated(parsed, mask) if key == section)
+    exact = _exact_values(parsed).get(section)
+    
+    return f"""PRE-CALCULATED DATA (do not override):
+{pre_calculated}
+
+TRANSCRIPT (turns relevant to this KPI):
+{transcript}
+
+Respond with ONLY valid JSON of the form {{"{section}": {{...}}}}, in the EXACT structure from your instructions (no extra text).{f" Use {exact}." if exact else ""}"""
+
+def _compact_lines(parsed: ParsedTranscript) -> Tuple[List[str], List[Optional[FrozenSet[str]]], int]:
+    """Transcript lines worth sending, the detector rule hits of each (None for lines that aren't
+    turns) and how many turns were compacted.
+
+    System turns after the first (which anchors the response time) are dropped unless a detector
+    rule hit them, and a long message repeated verbatim by the same speaker becomes a short
+    back-reference that keeps its timestamp.
+    """
+    lines, line_hits, compacted = [], [], 0
+    turns = iter(parsed.turns)  # parse_transcript keeps exactly the non-blank lines TURN_PATTERN matches
+    first_seen: Dict[Tuple[str, str], str] = {}
+    system_seen = False
+    for line in parsed.text.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        match = TURN_PATTERN.match(line)
+        if not match:
+            lines.append(line)
+            line_hits.append(None)
+            continue
+        turn = next(turns)
+        hits = turn_hits(turn)
+        timestamp = match.group(1).strip()
+        if turn.role == 'system':
+            if system_seen and not hits:
+                compacted += 1
+                continue
+            system_seen = True
+        key = (turn.speaker_lower, turn.lowered.strip())
+        if key in first_seen and len(turn.message) >= REPEAT_MIN_CHARS:
+            line = f"( {timestamp} ): {turn.speaker}: [repeats their message at {first_seen[key]}]"
+            compacted += 1
+        first_seen.setdefault(key, timestamp)
+        lines.append(line)
+        line_hits.append(hits)
+    return lines, line_hits, compacted
+
+def _fit_lines(lines: List[str], relevant: List[bool], allowance: int, model: str,
+               candidates: Optional[List[int]] = None) -> Tuple[str, int]:
+    """Join as many of the candidate lines (default: all) as fit in allowance tokens: lines with detector
+    hits first, then the ones nearest the start or end of the chat. Gaps become omission markers.
+    Returns (text, candidate lines omitted for the budget)."""
+    if candidates is None:
+        candidates = list(range(len(lines)))
+    text = _join_kept(lines, candidates, candidates)
+    if count_tokens(text, model) <= allowance:
+        return text, 0
+    costs = {index: count_tokens(lines[index], model) + 1 for index in candidates}
+    last = len(lines) - 1
+    order = sorted(candidates, key=lambda index: (not relevant[index], min(index, last - index)))
+    kept, used = [], 0
+    for index in order:
+        if used + costs[index] <= allowance:
+            kept.append(index)
+            used += costs[index]
+    while True:
+        text = _join_kept(lines, sorted(kept), candidates)
+        if not kept or count_tokens(text, model) <= allowance:
+            return text, len(candidates) - len(kept)
+        kept.pop()  # Omission markers pushed it over; give up the least important kept line
+
+def _join_kept(lines: List[str], kept: List[int], candidates: List[int]) -> str:
+    """Kept lines in order with an omission marker per gap. A gap without candidate lines was left
+    out as irrelevant to the KPI; any other gap was cut for the token budget."""
+    parts, previous = [], -1
+    candidate_set = set(candidates)
+    for index in kept + [len(lines)]:
+        if index - previous > 1:
+            budget_cut = any(gap in candidate_set for gap in range(previous + 1, index))
+            reason = "to fit the token budget" if budget_cut else "as not relevant to this KPI"
+            parts.append(f"[... {index - previous - 1} turns omitted {reason} ...]")
+        if index < len(lines):
+            parts.append(lines[index])
+        previous = index
+    return '\n'.join(parts)
+
+@lru_cache(maxsize=None)
+def system_prompt_tokens(model: str, section: Optional[str] = None) -> int:
+    """Tokens of the full SYSTEM_PROMPT, or of one KPI's sub-prompt system message."""
+    return count_tokens(SECTION_SYSTEM_PROMPTS[section] if section else SYSTEM_PROMPT, model)
+
+def build_budgeted_prompt(parsed: ParsedTranscript, masker: TokenMasker, model: str = "gpt-4o-mini",
+                          budget: int = PROMPT_TOKEN_BUDGET) -> Tuple[str, Dict[str, Any]]:
+    """build_smart_prompt over a compacted transcript, trimmed so system and user message together stay
+    within `budget` prompt tokens.
+
+    Masking is line-local, so lines are masked one by one with the transcript's own masker and keep
+    the placeholders of the full masked transcript. Returns (user message, prompt stats).
+    """
+    lines, line_hits, compacted = _compact_lines(parsed)
+    relevant = [hits is None or bool(hits) for hits in line_hits]
+    lines = [masker.mask(line) for line in lines]
+    allowance = budget - system_prompt_tokens(model) - count_tokens(build_smart_prompt('', parsed, masker), model)
+    transcript, omitted = _fit_lines(lines, relevant, allowance, model)
+    prompt = build_smart_prompt(transcript, parsed, masker)
+    return prompt, {
+        'prompt_tokens': system_prompt_tokens(model) + count_tokens(prompt, model),
+        'system_prompt_tokens': system_prompt_tokens(model),
+        'token_budget': budget,
+        'template_version': PROMPT_TEMPLATE_VERSION,  # Identifies the SYSTEM_PROMPT that preceded it
+        'tokenizer': tokenizer_name(model),
+        'turns_compacted': compacted,
+        'turns_omitted': omitted
+    }
+
+def _section_lines(line_hits: List[Optional[FrozenSet[str]]], rules: Optional[FrozenSet[str]]) -> Optional[List[int]]:
+    """Indices of the lines one KPI needs: any header before the first turn, that turn as a time anchor
+    and the turns hitting its rules, each with its continuation lines. None when it needs every line."""
+    if rules is None:
+        return None
+    kept, keep_continuation, anchored = [], True, False
+    for index, hits in enumerate(line_hits):
+        if hits is None:
+            if keep_continuation:
+                kept.append(index)
+            continue
+        keep_continuation = not anchored or bool(hits & rules)
+        anchored = True
+        if keep_continuation:
+            kept.append(index)
+    return kept
+
+def build_section_prompts(parsed: ParsedTranscript, masker: TokenMasker, model: str = "gpt-4o-mini",
+                          budget: int = PROMPT_TOKEN_BUDGET) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    """One build_section_prompt per KPI section, each over only the compacted lines its rules mark as
+    relevant and within `budget` prompt tokens. Returns (section -> user message, prompt stats)."""
+    lines, line_hits, compacted = _compact_lines(parsed)
+    relevant = [hits is None or bool(hits) for hits in line_hits]
+    lines = [masker.mask(line) for line in lines]
+    prompts, section_tokens, omitted = {}, {}, 0
+    for section in KPI_SECTIONS:
+        candidates = _section_lines(line_hits, SECTION_RULES[section])
+        system_tokens = system_prompt_tokens(model, section)
+        allowance = budget - system_tokens - count_tokens(build_section_prompt(section, '', parsed, masker), model)
+        transcript, section_omitted = _fit_lines(lines, relevant if candidates is None else [True] * len(lines), allowance, model, candidates)
+        prompts[section] = build_section_prompt(section, transcript, parsed, masker)
+        section_tokens[section] = system_tokens + count_tokens(prompts[section], model)
+        omitted += section_omitted
+    return prompts, {
+        'prompt_tokens': sum(section_tokens.values()),
+        'section_prompt_tokens': section_tokens,
+        'system_prompt_tokens': sum(system_prompt_tokens(model, section) for section in KPI_SECTIONS),
+        'token_budget': budget,
+        'template_version': PROMPT_TEMPLATE_VERSION,
+        'tokenizer': tokenizer_name(model),
+        'turns_compacted': compacted,
+        'turns_omitted': omitted
+    }
@@ -0,0 +1,208 @@
+import json
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict, ValidationError, field_validator
+
+KPI_SECTIONS = (
+    'first_response_analysis',
+    'security_verification_analysis',
+    'customer_needs_analysis',
+    'interaction_analysis',
+    'time_respect_analysis',
+    'needs_identification_analysis',
+    'transfer_analysis'
+)
+
+# Characters that can change the scanner state; everything else is skipped by finditer
+SCANNER_PATTERN = re.compile(r'[{}"\\]')
+
+class JsonObjectScanner:
+    """Incremental brace-depth scanner: feed text in chunks, get back each complete top-level {...} span.
+
+    Braces inside string literals (and escaped quotes) are tracked, so reasoning text can contain
+    anything; text between objects, such as prose or ```json fences, is ignored. Object-valued
+    members of a top-level object ("key": {...}) are collected in `members` as soon as they close,
+    which lets a streamed response be used section by section.
+    """
+    __slots__ = ('_buffer', '_offset', '_depth', '_start', '_in_string', '_escaped_at',
+                 '_string_start', '_key', '_member_start', 'members')
+
+    def __init__(self):
+        self._buffer = ''
+        self._offset = 0  # Absolute position of _buffer[0]
+        self._depth = 0
+        self._start = 0
+        self._in_string = False
+        self._escaped_at = -1  # Absolute position of the character a backslash escapes
+        self._string_start = 0
+        self._key = ''  # Last string seen directly inside the top-level object
+        self._member_start = 0
+        self.members: List[Tuple[str, str]] = []  # (key, object text); callers take them as they come
+
+    def _text(self, start: int, end: int) -> str:
+        return self._buffer[start - self._offset:end - self._offset]
+
+    def feed(self, chunk: str) -> List[str]:
+        complete = []
+        base = self._offset + len(self._buffer)
+        self._buffer += chunk
+        for match in SCANNER_PATTERN.finditer(chunk):
+            position = base + match.start()
+            char = match.group()
+            if self._depth == 0:
+                if char == '{':
+                    self._depth, self._start = 1, position
+                continue
+            if self._in_string:
+                if position == self._escaped_at:
+                    continue
+                if char == '\\':
+                    self._escaped_at = position + 1
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._key = self._text(self._string_start + 1, position)
+            elif char == '"':
+                self._in_string = True
+                self._string_start = position
+            elif char == '{':
+                self._depth += 1
+                if self._depth == 2:
+                    self._member_start = position
+            elif char == '}':
+                self._depth -= 1
+                if self._depth == 1:
+                    self.members.append((self._key, self._text(self._member_start, position + 1)))
+                elif self._depth == 0:
+                    complete.append(self._text(self._start, position + 1))
+        # Only an unfinished object needs to be kept around
+        keep_from = self._start if self._depth else self._offset + len(self._buffer)
+        self._buffer = self._buffer[keep_from - self._offset:]
+        self._offset = keep_from
+        return complete
+
+    @property
+    def pending(self) -> bool:
+        """True while an object has been opened but not closed (e.g. a response cut off by max_tokens)."""
+        return self._depth > 0
+
+class KpiSection(BaseModel):
+    """One KPI section as the LLM returns it; section-specific fields are kept as extras."""
+    model_config = ConfigDict(extra='allow')
+
+    score: int = 0
+    reasoning: str = "No reasoning provided by LLM"
+
+    @field_validator('score', mode='before')
+    @classmethod
+    def _whole_score(cls, value: Any) -> int:
+        # Rubrics allow half points ("2.5 points"); truncated like the int() scores always were
+        if value is None:
+            return 0
+        try:
+            return int(float(value))
+        except (TypeError, OverflowError) as e:  # Only ValueError becomes a ValidationError
+            raise ValueError(f"score must be a number, got {value!r}") from e
+
+    @field_validator('reasoning', mode='before')
+    @classmethod
+    def _reasoning_text(cls, value: Any) -> str:
+        return "No reasoning provided by LLM" if value is None else str(value)
+
+class AnalysisResponse(BaseModel):
+    model_config = ConfigDict(extra='allow')
+
+    first_response_analysis: Optional[KpiSection] = None
+    security_verification_analysis: Optional[KpiSection] = None
+    customer_needs_analysis: Optional[KpiSection] = None
+    interaction_analysis: Optional[KpiSection] = None
+    time_respect_analysis: Optional[KpiSection] = None
+    needs_identification_analysis: Optional[KpiSection] = None
+    transfer_analysis: Optional[KpiSection] = None
+    overall_scores: Optional[Dict[str, Any]] = None
+
+def response_format(mode: str) -> Optional[Dict[str, Any]]:
+    """OpenAI response_format for LLM_RESPONSE_FORMAT: 'text' (none), 'json_object' or 'json_schema'."""
+    if mode == 'json_object':
+        return {"type": "json_object"}
+    if mode == 'json_schema':
+        return {"type": "json_schema",
+                "json_schema": {"name": "qa_analysis", "schema": AnalysisResponse.model_json_schema(), "strict": False}}
+    if mode != 'text':
+        raise ValueError(f"Unknown LLM response format: {mode}")
+    return None
+
+def parse_analysis_response(response_text: str) -> Tuple[Optional[Dict[str, Any]], str]:
+    """Find the analysis JSON in an LLM response and validate its KPI sections.
+
+    Returns (result dict or None, outcome) where outcome is 'parsed', 'no_json', 'invalid_json' or
+    'validation_failed'. The dict keeps every key of the response; present sections are normalised
+    and each invalid one is dropped (reported downstream as missing). Only a response whose sections
+    are all invalid fails validation as a whole.
+    """
+    scanner = JsonObjectScanner()
+    objects = scanner.feed(response_text)
+    if not objects:
+        return None, 'invalid_json' if scanner.pending else 'no_json'
+    for candidate in objects:
+        try:
+            parsed = json.loads(candidate)
+            break
+        except ValueError:
+            continue
+    else:
+        return None, 'invalid_json'
+    if not isinstance(parsed, dict):
+        return None, 'validation_failed'
+    valid, invalid = 0, 0
+    for section in KPI_SECTIONS:
+        if parsed.get(section) is None:
+            parsed.pop(section, None)
+            continue
+        try:
+            parsed[section] = KpiSection.model_validate(parsed[section]).model_dump()
+            valid += 1
+        except ValidationError:
+            del parsed[section]
+            invalid += 1
+    if invalid and not valid:
+        return None, 'validation_failed'
+    if not isinstance(parsed.get('overall_scores', {}), dict):
+        del parsed['overall_scores']  # Recomputed from the sections
+    return parsed, 'parsed'
+
+def parse_section(text: str) -> Optional[Dict[str, Any]]:
+    """Validate one KPI section object, e.g. as it closes in a streamed response; None if it is invalid."""
+    try:
+        return KpiSection.model_validate_json(text).model_dump()
+    except ValidationError:
+        return None
+
+class ParseMetrics:
+    """Process-wide counts of how LLM responses parsed, for the parsing stats endpoint."""
+
+    def __init__(self):
+        self.counters = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, outcome: str) -> None:
+        with self._lock:
+            self.counters[outcome] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = sum(self.counters.values())
+            failures = total - self.counters['parsed']
+            return {
+                'responses': total,
+                'parsed': self.counters['parsed'],
+                'no_json': self.counters['no_json'],
+                'invalid_json': self.counters['invalid_json'],
+                'validation_failed': self.counters['validation_failed'],
+                'failure_rate': round(failures / total, 4) if total else 0.0
+            }
+
+parse_metrics = ParseMetrics()
@@ -1,6 +1,10 @@
 import streamlit as st
 from analyzers.analyzer import analyze_transcript  # Import main function
 from utils.detectors import pre_check_callback, pre_check_interaction, pre_check_time_respect, pre_check_needs, pre_check_transfer  # Added pre_check_transfer
+from utils.tracing import StreamlitTraceSink, set_trace_sink
+
+# Detector traces are only rendered in the Streamlit UI; other callers get the no-op sink
+set_trace_sink(StreamlitTraceSink())
 
 # UI Layout (Set config first)
 st.set_page_config(page_title="QA Analysis Dashboard", page_icon="📊", layout="wide")
@@ -70,7 +74,7 @@ with col2:
     uploaded_files = st.file_uploader("Or Upload Transcript File (.txt)", type="txt", accept_multiple_files=True)  # New: Multiple for batch
 
 # Analyze Button
-model_select = st.selectbox("Select LLM Model", ["gpt-4o", "gpt-4o-mini"], index=0)  # Default gpt-4o
+model_select = st.selectbox("Select LLM Model", ["gpt-4o", "gpt-4o-mini", "auto"], index=0)  # Default gpt-4o; auto = tiered routing
 if st.button("Analyze Transcript"):
     transcripts = []
     if uploaded_files:
@@ -0,0 +1,110 @@
+import threading
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import database
+
+GRANULARITIES = ('day', 'week')
+
+# (model, kpi, analyses, score_sum, percentage_sum, checked, failed)
+DayRow = Tuple[str, str, int, int, float, int, int]
+
+class DailyKpiAggregates:
+    """Per-day KPI aggregates grouped by model, computed with one indexed GROUP BY.
+
+    Analyses are stamped with the insert time, so a UTC day is final once it is over: closed days
+    are cached after their first query and only today (plus any not yet cached days) hits SQLite.
+    """
+
+    def __init__(self):
+        self._days: Dict[str, List[DayRow]] = {}
+        self._lock = threading.Lock()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._days.clear()
+
+    def _query(self, since: date) -> Dict[str, List[DayRow]]:
+        rows = database.get_connection().execute('''
+            SELECT date(a.created_at), a.model_used, k.kpi, COUNT(*), SUM(k.score),
+                   TOTAL(100.0 * k.score / k.max_score), COUNT(k.pre_check_passed),
+                   COUNT(CASE WHEN k.pre_check_passed = 0 THEN 1 END)
+            FROM analyses a JOIN analysis_kpis k ON k.analysis_id = a.id
+            WHERE a.created_at >= ?
+            GROUP BY date(a.created_at), a.model_used, k.kpi
+        ''', (since.isoformat(),)).fetchall()
+        by_day: Dict[str, List[DayRow]] = {}
+        for day, *row in rows:
+            by_day.setdefault(day, []).append(tuple(row))
+        return by_day
+
+    def days(self, since: date) -> Dict[str, List[DayRow]]:
+        today = datetime.utcnow().date()
+        wanted = [(since + timedelta(days=offset)).isoformat() for offset in range((today - since).days + 1)]
+        with self._lock:
+            missing = [day for day in wanted[:-1] if day not in self._days]
+        fetched = self._query(date.fromisoformat(missing[0]) if missing else today)
+        with self._lock:
+            for day in missing:
+                self._days[day] = fetched.get(day, [])
+            return {day: self._days[day] if day in self._days else fetched.get(day, []) for day in wanted}
+
+daily_kpi_aggregates = DailyKpiAggregates()
+
+def _bucket(day: str, granularity: str) -> str:
+    if granularity == 'week':
+        parsed = date.fromisoformat(day)
+        return (parsed - timedelta(days=parsed.weekday())).isoformat()  # Monday of the week
+    return day
+
+def _window_start(days: int, granularity: str) -> date:
+    start = datetime.utcnow().date() - timedelta(days=days - 1)
+    return date.fromisoformat(_bucket(start.isoformat(), granularity))
+
+def kpi_trends(granularity: str = 'day', days: int = 90, model: Optional[str] = None,
+               kpi: Optional[str] = None) -> Dict[str, Any]:
+    """Average score per KPI per day/week bucket, one series per model."""
+    since = _window_start(days, granularity)
+    totals: Dict[Tuple[str, str, str], List[float]] = {}
+    for day, rows in daily_kpi_aggregates.days(since).items():
+        for row_model, row_kpi, analyses, score_sum, percentage_sum, _, _ in rows:
+            if (model is not None and row_model != model) or (kpi is not None and row_kpi != kpi):
+                continue
+            total = totals.setdefault((_bucket(day, granularity), row_model, row_kpi), [0, 0, 0.0])
+            total[0] += analyses
+            total[1] += score_sum
+            total[2] += percentage_sum
+    return {
+        "granularity": granularity,
+        "since": since.isoformat(),
+        "points": [{
+            "bucket": bucket,
+            "model": row_model,
+            "kpi": row_kpi,
+            "analyses": analyses,
+            "average_score": round(score_sum / analyses, 2),
+            "average_percentage": round(percentage_sum / analyses, 2)
+        } for (bucket, row_model, row_kpi), (analyses, score_sum, percentage_sum) in sorted(totals.items())]
+    }
+
+def pre_check_failures(days: int = 30, model: Optional[str] = None, limit: int = 10) -> Dict[str, Any]:
+    """KPI pre-checks ranked by how often they failed within the window."""
+    since = _window_start(days, 'day')
+    counts: Dict[str, List[int]] = {}
+    for rows in daily_kpi_aggregates.days(since).values():
+        for row_model, row_kpi, _, _, _, checked, failed in rows:
+            if model is not None and row_model != model:
+                continue
+            total = counts.setdefault(row_kpi, [0, 0])
+            total[0] += checked
+            total[1] += failed
+    ranked = sorted(counts.items(), key=lambda item: (-item[1][1], item[0]))[:limit]
+    return {
+        "since": since.isoformat(),
+        "failures": [{
+            "kpi": row_kpi,
+            "checked": checked,
+            "failed": failed,
+            "failure_rate": round(failed / checked, 4) if checked else None
+        } for row_kpi, (checked, failed) in ranked]
+    }
@@ -0,0 +1,141 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from config import (ANALYSIS_CACHE_ENABLED, ANALYSIS_CACHE_PATH, ANALYSIS_CACHE_TTL_SECONDS,
+                    ANALYSIS_CACHE_MEMORY_ENTRIES, ANALYSIS_CACHE_MAX_ROWS)
+from analyzers.prompt_builder import PROMPT_TEMPLATE_VERSION
+from utils.detectors import DETECTOR_VERSION
+
+class AnalysisCache:
+    """Two-tier cache of LLM responses: an in-process LRU in front of a SQLite table.
+
+    Keys are content addresses of everything that determines the completion: model, prompt template
+    version, detector version and the prompt itself (which embeds the masked transcript and the
+    pre-check values). Values are the raw response text, so no unmasked transcript is ever stored;
+    callers re-run the cheap deterministic scoring on a hit.
+    """
+
+    PRUNE_EVERY = 100  # Writes between TTL/size sweeps of the SQLite tier
+
+    def __init__(self, path: str, ttl_seconds: int, memory_entries: int, max_rows: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.memory_entries = memory_entries
+        self.max_rows = max_rows
+        self._memory: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._writes = 0
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'expired': 0}
+
+    @staticmethod
+    def key_for(model: str, prompt: str) -> str:
+        digest = hashlib.sha256()
+        for part in (PROMPT_TEMPLATE_VERSION, DETECTOR_VERSION, model, prompt):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\x00')
+        return digest.hexdigest()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS analysis_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    model TEXT,
+                    response_text TEXT,
+                    created_at REAL,
+                    last_access REAL
+                )
+            ''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_analysis_cache_last_access ON analysis_cache(last_access)')
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, response_text = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.counters['memory_hits'] += 1
+                    return response_text
+                del self._memory[key]
+                self.counters['expired'] += 1
+
+            conn = self._connection()
+            row = conn.execute('SELECT response_text, created_at FROM analysis_cache WHERE cache_key = ?', (key,)).fetchone()
+            if row is None:
+                self.counters['misses'] += 1
+                return None
+            response_text, created_at = row
+            if now - created_at > self.ttl_seconds:
+                conn.execute('DELETE FROM analysis_cache WHERE cache_key = ?', (key,))
+                conn.commit()
+                self.counters['expired'] += 1
+                self.counters['misses'] += 1
+                return None
+            conn.execute('UPDATE analysis_cache SET last_access = ? WHERE cache_key = ?', (now, key))
+            conn.commit()
+            self._remember(key, created_at, response_text)
+            self.counters['disk_hits'] += 1
+            return response_text
+
+    def put(self, key: str, model: str, response_text: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, response_text)
+            conn = self._connection()
+            conn.execute('''
+                INSERT OR REPLACE INTO analysis_cache (cache_key, model, response_text, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (key, model, response_text, now, now))
+            conn.commit()
+            self.counters['stores'] += 1
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._prune(now)
+
+    def _remember(self, key: str, created_at: float, response_text: str) -> None:
+        self._memory[key] = (created_at, response_text)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self.counters['evictions'] += 1
+
+    def _prune(self, now: float) -> None:
+        """Drop expired rows, then the least recently used rows beyond max_rows."""
+        conn = self._connection()
+        expired = conn.execute('DELETE FROM analysis_cache WHERE created_at < ?', (now - self.ttl_seconds,)).rowcount
+        overflow = conn.execute('''
+            DELETE FROM analysis_cache WHERE cache_key IN (
+                SELECT cache_key FROM analysis_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_rows,)).rowcount
+        conn.commit()
+        self.counters['expired'] += expired
+        self.counters['evictions'] += overflow
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.counters['memory_hits'] + self.counters['disk_hits'] + self.counters['misses']
+            hits = self.counters['memory_hits'] + self.counters['disk_hits']
+            return {
+                **self.counters,
+                'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'enabled': ANALYSIS_CACHE_ENABLED,
+                'prompt_template_version': PROMPT_TEMPLATE_VERSION,
+                'detector_version': DETECTOR_VERSION
+            }
+
+analysis_cache = AnalysisCache(ANALYSIS_CACHE_PATH, ANALYSIS_CACHE_TTL_SECONDS,
+                               ANALYSIS_CACHE_MEMORY_ENTRIES, ANALYSIS_CACHE_MAX_ROWS)
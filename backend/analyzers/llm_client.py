@@ -0,0 +1,215 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import openai
+
+from analyzers.tokenizer import count_tokens
+
+# Status codes worth another attempt: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUS = {408, 409, 429}
+MESSAGE_OVERHEAD_TOKENS = 4  # Role and separators around each chat message
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the provider while the circuit breaker is open."""
+
+class TokenBucket:
+    """Client-side quota of `rate` units per minute. Reservations may overdraw the bucket; the caller
+    then waits until the refill covers its debt, which keeps concurrent callers in arrival order."""
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, per_minute: int):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take `amount` and return the seconds to wait before using it."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= amount
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Retry-After (or retry-after-ms) from a provider error response, if it sent one in seconds."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if headers is None:
+        return None
+    try:
+        if headers.get('retry-after-ms') is not None:
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after') is not None:
+            return float(headers['retry-after'])
+    except ValueError:  # HTTP-date form; fall back to our own backoff
+        pass
+    return None
+
+class RateLimiter:
+    """Shared by the sync and async clients of a process: request and token buckets, retry policy,
+    circuit breaker and metrics. A limit of 0 disables that bucket."""
+
+    def __init__(self, rpm: int, tpm: int, max_retries: int = 5, backoff_seconds: float = 1.0,
+                 max_backoff_seconds: float = 30.0, breaker_threshold: int = 5, breaker_cooldown_seconds: float = 30.0):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown_seconds = breaker_cooldown_seconds
+        self.state = 'closed'
+        self._failures = 0  # Consecutive failed attempts (server errors, timeouts, connection errors)
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._paused_until = 0.0  # Set by a provider Retry-After; holds back every caller
+        self.counters = {'requests': 0, 'attempts': 0, 'succeeded': 0, 'failed': 0, 'rate_limited': 0,
+                         'retries': 0, 'circuit_rejected': 0, 'circuit_opened': 0}
+        self.wait_seconds = {'throttle': 0.0, 'backoff': 0.0}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def estimate_tokens(kwargs: Dict[str, Any]) -> int:
+        """Quota a completion counts against: prompt tokens plus max_tokens, as the provider reserves them."""
+        model = kwargs.get('model', 'gpt-4o-mini')
+        prompt = sum(count_tokens(message.get('content') or '', model) + MESSAGE_OVERHEAD_TOKENS for message in kwargs.get('messages', []))
+        return prompt + kwargs.get('max_tokens', 0)
+
+    def acquire(self, tokens: int, first_attempt: bool) -> float:
+        """Admit one attempt: raise CircuitOpenError or return the seconds to wait before sending it."""
+        with self._lock:
+            now = time.monotonic()
+            if first_attempt:
+                self.counters['requests'] += 1
+                if self.state == 'open' and now - self._opened_at >= self.breaker_cooldown_seconds:
+                    self.state = 'half_open'
+            if self.state == 'open' or (first_attempt and self.state == 'half_open' and self._trial_in_flight):
+                # Retries still pending when the circuit opened are dropped too
+                self.counters['circuit_rejected'] += 1
+                raise CircuitOpenError(f"LLM circuit open after {self._failures} consecutive failures")
+            if first_attempt and self.state == 'half_open':
+                self._trial_in_flight = True  # One trial request decides whether to close again
+            self.counters['attempts'] += 1
+            wait = max(self._paused_until - now, 0.0)
+            if self.requests is not None:
+                wait = max(wait, self.requests.reserve(1, now))
+            if self.tokens is not None:
+                wait = max(wait, self.tokens.reserve(tokens, now))
+            self.wait_seconds['throttle'] += wait
+            return wait
+
+    def cancelled(self) -> None:
+        """The caller gave up mid-request (task cancelled); don't leave a half-open trial pending."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def succeeded(self) -> None:
+        with self._lock:
+            self.counters['succeeded'] += 1
+            self._failures = 0
+            self._trial_in_flight = False
+            self.state = 'closed'
+
+    def failed(self, error: Exception, attempt: int) -> Optional[float]:
+        """Seconds to back off before retrying `error`, or None when the request has failed for good."""
+        status = getattr(error, 'status_code', None)
+        retryable = isinstance(error, openai.APIConnectionError) or status in RETRYABLE_STATUS or (status or 0) >= 500
+        with self._lock:
+            if status == 429:
+                self.counters['rate_limited'] += 1
+            elif retryable:  # Provider trouble; rate limits are handled by backing off, bad requests say nothing
+                self._failures += 1
+                if self.state == 'half_open' or self._failures >= self.breaker_threshold:
+                    if self.state != 'open':
+                        self.counters['circuit_opened'] += 1
+                    self.state = 'open'
+                    self._opened_at = time.monotonic()
+            if retryable and attempt < self.max_retries and self.state != 'open':
+                delay = random.uniform(0, min(self.max_backoff_seconds, self.backoff_seconds * 2 ** attempt))  # Full jitter
+                retry_after = retry_after_seconds(error)
+                if retry_after is not None:
+                    delay = retry_after + random.uniform(0, self.backoff_seconds)
+                    self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                self.counters['retries'] += 1
+                self.wait_seconds['backoff'] += delay
+                return delay
+            self.counters['failed'] += 1
+            self._trial_in_flight = False
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.counters,
+                'circuit_state': self.state,
+                'consecutive_failures': self._failures,
+                'throttle_wait_seconds': round(self.wait_seconds['throttle'], 3),
+                'backoff_wait_seconds': round(self.wait_seconds['backoff'], 3),
+                'rpm_limit': round(self.requests.rate * 60) if self.requests else None,
+                'tpm_limit': round(self.tokens.rate * 60) if self.tokens else None
+            }
+
+class _Completions:
+    def __init__(self, create):
+        self.create = create
+
+class _Chat:
+    def __init__(self, create):
+        self.completions = _Completions(create)
+
+class RateLimitedClient:
+    """openai.OpenAI stand-in for `chat.completions.create`, throttled and retried by a RateLimiter.
+    Build the wrapped client with max_retries=0 so the SDK doesn't retry underneath."""
+
+    def __init__(self, client: openai.OpenAI, limiter: RateLimiter):
+        self._client = client
+        self.limiter = limiter
+        self.chat = _Chat(self._create)
+
+    def _create(self, **kwargs):
+        tokens = self.limiter.estimate_tokens(kwargs)
+        attempt = 0
+        while True:
+            time.sleep(self.limiter.acquire(tokens, attempt == 0))
+            try:
+                response = self._client.chat.completions.create(**kwargs)
+            except Exception as e:
+                delay = self.limiter.failed(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.limiter.succeeded()
+            return response
+
+class AsyncRateLimitedClient:
+    """RateLimitedClient for openai.AsyncOpenAI; waits with asyncio.sleep."""
+
+    def __init__(self, client: openai.AsyncOpenAI, limiter: RateLimiter):
+        self._client = client
+        self.limiter = limiter
+        self.chat = _Chat(self._create)
+
+    async def _create(self, **kwargs):
+        tokens = self.limiter.estimate_tokens(kwargs)
+        attempt = 0
+        while True:
+            await asyncio.sleep(self.limiter.acquire(tokens, attempt == 0))
+            try:
+                response = await self._client.chat.completions.create(**kwargs)
+            except asyncio.CancelledError:
+                self.limiter.cancelled()
+                raise
+            except Exception as e:
+                delay = self.limiter.failed(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self.limiter.succeeded()
+            return response
@@ -0,0 +1,89 @@
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from analyzers.response_parser import KPI_SECTIONS
+
+# Model name that asks for tiered routing instead of one fixed model
+ROUTED_MODEL = 'auto'
+
+# USD per 1M tokens: (prompt, cached prompt, completion)
+MODEL_PRICES = {
+    'gpt-4o-mini': (0.15, 0.075, 0.60),
+    'gpt-4o': (2.50, 1.25, 10.00)
+}
+
+def completion_cost(model: str, usage: Optional[Dict[str, int]]) -> Optional[float]:
+    """Cost of one completion from its recorded usage; None for unpriced models or missing usage."""
+    prices = MODEL_PRICES.get(model)
+    if prices is None or usage is None:
+        return None
+    prompt_price, cached_price, completion_price = prices
+    uncached = usage['prompt_tokens'] - usage['cached_tokens']
+    return round((uncached * prompt_price + usage['cached_tokens'] * cached_price
+                  + usage['completion_tokens'] * completion_price) / 1e6, 6)
+
+def disagreements(result: Dict[str, Any], deterministic: Dict[str, Any], uncertain: Dict[str, str]) -> List[str]:
+    """Sections whose LLM score contradicts the pre-check score. Extra credit on a KPI the detectors
+    are unsure about is the refinement the LLM is there for, so it doesn't count."""
+    contradicting = []
+    for section in KPI_SECTIONS:
+        if section not in result:
+            continue  # Reported as partial_error
+        score, expected = result[section].get('score', 0), deterministic[section]['score']
+        if score != expected and not (section in uncertain and score > expected):
+            contradicting.append(section)
+    return contradicting
+
+def escalation_reasons(result: Dict[str, Any], contradicting: List[str], max_disagreements: int) -> List[str]:
+    reasons = []
+    if 'api_error' in result:
+        reasons.append('api_error')
+    elif 'error' in result:
+        reasons.append(result.get('parse_outcome', 'parse_error'))
+    if 'partial_error' in result:
+        reasons.append('partial_error')
+    if len(contradicting) > max_disagreements:
+        reasons.append('disagreement')
+    return reasons
+
+class RoutingMetrics:
+    """Process-wide routing outcomes, for the routing stats endpoint: escalation rate and per-tier latency and cost."""
+
+    def __init__(self):
+        self.routed = 0
+        self.escalated = 0
+        self.reasons = defaultdict(int)
+        self.tiers = defaultdict(lambda: {'calls': 0, 'latency_seconds': 0.0, 'cost_usd': 0.0})
+        self._lock = threading.Lock()
+
+    def record(self, routing: Dict[str, Any]) -> None:
+        with self._lock:
+            self.routed += 1
+            self.escalated += routing['escalated']
+            for attempt in routing['tiers']:
+                tier = self.tiers[attempt['model']]
+                tier['calls'] += 1
+                tier['latency_seconds'] += attempt['latency_seconds']
+                tier['cost_usd'] += attempt['cost_usd'] or 0.0
+                for reason in attempt['escalation_reasons']:
+                    self.reasons[reason] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'routed': self.routed,
+                'escalated': self.escalated,
+                'escalation_rate': round(self.escalated / self.routed, 4) if self.routed else 0.0,
+                'reasons': dict(self.reasons),
+                'tiers': {
+                    model: {
+                        'calls': tier['calls'],
+                        'avg_latency_seconds': round(tier['latency_seconds'] / tier['calls'], 4),
+                        'cost_usd': round(tier['cost_usd'], 6),
+                        'avg_cost_usd': round(tier['cost_usd'] / tier['calls'], 6)
+                    } for model, tier in self.tiers.items()
+                }
+            }
+
+routing_metrics = RoutingMetrics()
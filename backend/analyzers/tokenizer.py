@@ -0,0 +1,38 @@
+import re
+from functools import lru_cache
+
+try:
+    import tiktoken
+    import tiktoken.model
+except ImportError:  # Token counts fall back to a local estimate
+    tiktoken = None
+
+# Pre-tokenizer of the GPT BPE encodings: words with their leading space, up to three digits,
+# punctuation runs and whitespace. Without tiktoken (or its BPE files) every piece counts as one token, plus one per
+# further 8 characters for long words that BPE would split.
+ESTIMATE_PATTERN = re.compile(r"'(?:[sdmt]|ll|ve|re)| ?[A-Za-z]+| ?\d{1,3}| ?[^\sA-Za-z\d]+|\s+")
+FALLBACK_ENCODING = 'o200k_base'
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        name = tiktoken.model.encoding_name_for_model(model)
+    except KeyError:  # Model name tiktoken does not know yet
+        name = FALLBACK_ENCODING
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception:  # BPE file neither in TIKTOKEN_CACHE_DIR nor downloadable
+        return None
+
+def tokenizer_name(model: str) -> str:
+    encoding = _encoding(model)
+    return encoding.name if encoding is not None else 'estimate'
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """Prompt tokens of text for model: exact with tiktoken, estimated otherwise."""
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return sum(1 + (len(piece) - 1) // 8 for piece in ESTIMATE_PATTERN.findall(text))
@@ -0,0 +1,128 @@
+import struct
+import threading
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+try:
+    import zstandard
+except ImportError:  # zlib (with a preset dictionary) is used instead
+    zstandard = None
+
+# Blob layout: codec byte, big-endian dictionary id (0 = none), compressed payload. Codec bytes never
+# collide with 0x78, the first byte of the bare zlib streams written before this format existed.
+HEADER = struct.Struct('>BI')
+CODEC_IDS = {'zlib': 1, 'zstd': 2}
+CODEC_NAMES = {value: key for key, value in CODEC_IDS.items()}
+
+Blob = Union[str, bytes]
+
+def resolve_codec(name: str) -> str:
+    """'auto' picks zstd when the zstandard package is installed, zlib otherwise."""
+    if name == 'auto':
+        return 'zstd' if zstandard is not None else 'zlib'
+    if name not in ('none', *CODEC_IDS):
+        raise ValueError(f"Unknown storage codec: {name}")
+    if name == 'zstd' and zstandard is None:
+        raise ValueError("Storage codec 'zstd' needs the zstandard package")
+    return name
+
+def build_zlib_dictionary(samples: Iterable[str], size: int) -> bytes:
+    """Preset dictionary for zlib: the most valuable recurring word 4-grams across the samples.
+
+    A phrase is worth (documents containing it) x (its length). zlib matches nearer bytes more
+    cheaply, so the most valuable phrases go at the end of the dictionary.
+    """
+    document_frequency = Counter()
+    for sample in samples:
+        words = sample.split(' ')
+        document_frequency.update({' '.join(words[i:i + 4]) for i in range(len(words) - 3)})
+    phrases = sorted((phrase for phrase, count in document_frequency.items() if count > 1),
+                     key=lambda phrase: document_frequency[phrase] * len(phrase), reverse=True)
+    chosen, used = [], 0
+    for phrase in phrases:
+        encoded = phrase.encode('utf-8') + b' '
+        if used + len(encoded) > size:
+            break
+        chosen.append(encoded)
+        used += len(encoded)
+    return b''.join(reversed(chosen))
+
+class BlobCodec:
+    """Compresses stored text with per-kind dictionaries ('transcript', 'result') trained on our own rows.
+
+    Dictionaries are registered by id; encoding uses the newest one for the kind and codec, decoding
+    uses whichever id the blob names, so retraining never invalidates existing rows. Codec 'none'
+    stores plain text.
+    """
+
+    def __init__(self, codec: str = 'auto', level: Optional[int] = None):
+        self.codec = resolve_codec(codec)
+        self.level = level if level is not None else (6 if self.codec == 'zlib' else 9)
+        self._dictionaries: Dict[int, Tuple[str, bytes]] = {}
+        self._active: Dict[Tuple[str, str], int] = {}
+        self._local = threading.local()  # zstandard (de)compressors must not be shared across threads
+
+    def register_dictionary(self, dictionary_id: int, kind: str, codec: str, content: bytes) -> None:
+        self._dictionaries[dictionary_id] = (codec, content)
+        if dictionary_id >= self._active.get((kind, codec), 0):
+            self._active[(kind, codec)] = dictionary_id
+
+    def active_dictionary(self, kind: str) -> int:
+        return self._active.get((kind, self.codec), 0)
+
+    def train(self, samples: Iterable[str], size: int = 64 * 1024) -> Optional[bytes]:
+        """Build a dictionary for this codec from sample texts; None when there is too little data."""
+        samples = [sample for sample in samples if sample]
+        if self.codec == 'none' or len(samples) < 8:
+            return None
+        if self.codec == 'zstd':
+            try:
+                return zstandard.train_dictionary(size, [sample.encode('utf-8') for sample in samples]).as_bytes()
+            except zstandard.ZstdError:
+                return None
+        # zlib only looks back 32 KB, so a larger dictionary would be wasted
+        return build_zlib_dictionary(samples, min(size, 32 * 1024)) or None
+
+    def _zstd(self, dictionary_id: int, compress: bool):
+        cache = self._local.__dict__.setdefault('zstd', {})
+        key = (dictionary_id, compress)
+        if key not in cache:
+            dictionary = None
+            if dictionary_id:
+                dictionary = zstandard.ZstdCompressionDict(self._dictionaries[dictionary_id][1])
+            if compress:
+                cache[key] = zstandard.ZstdCompressor(level=self.level, dict_data=dictionary)
+            else:
+                cache[key] = zstandard.ZstdDecompressor(dict_data=dictionary)
+        return cache[key]
+
+    def encode(self, text: str, kind: str) -> Blob:
+        if self.codec == 'none':
+            return text
+        dictionary_id = self.active_dictionary(kind)
+        data = text.encode('utf-8')
+        if self.codec == 'zstd':
+            payload = self._zstd(dictionary_id, True).compress(data)
+        elif dictionary_id:
+            compressor = zlib.compressobj(self.level, zdict=self._dictionaries[dictionary_id][1])
+            payload = compressor.compress(data) + compressor.flush()
+        else:
+            payload = zlib.compress(data, self.level)
+        return HEADER.pack(CODEC_IDS[self.codec], dictionary_id) + payload
+
+    def decode(self, blob: Blob) -> str:
+        if isinstance(blob, str):
+            return blob
+        if blob[:1] == b'\x78':  # Bare zlib stream from the first artifact-store migration
+            return zlib.decompress(blob).decode('utf-8')
+        codec_id, dictionary_id = HEADER.unpack_from(blob)
+        payload = blob[HEADER.size:]
+        codec = CODEC_NAMES[codec_id]
+        if codec == 'zstd':
+            if zstandard is None:
+                raise RuntimeError("Stored data is zstd-compressed; install the zstandard package")
+            return self._zstd(dictionary_id, False).decompress(payload).decode('utf-8')
+        if dictionary_id:
+            return zlib.decompressobj(zdict=self._dictionaries[dictionary_id][1]).decompress(payload).decode('utf-8')
+        return zlib.decompress(payload).decode('utf-8')
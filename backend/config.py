@@ -1,13 +1,47 @@
 import os
-import streamlit as st
 import openai
+from analyzers.llm_client import AsyncRateLimitedClient, RateLimitedClient, RateLimiter
+
+# Client-side limits for completions, shared by both clients; set them to the account's quota (0 disables)
+LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "500"))
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "200000"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))  # 429/5xx/connection errors; Retry-After is honored
+LLM_BACKOFF_SECONDS = float(os.getenv("LLM_BACKOFF_SECONDS", "1.0"))
+LLM_MAX_BACKOFF_SECONDS = float(os.getenv("LLM_MAX_BACKOFF_SECONDS", "30.0"))
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))  # Consecutive 5xx/connection failures that open the circuit
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30.0"))
 
 # Global config
-client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+llm_limiter = RateLimiter(LLM_RPM_LIMIT, LLM_TPM_LIMIT, LLM_MAX_RETRIES, LLM_BACKOFF_SECONDS, LLM_MAX_BACKOFF_SECONDS,
+                          LLM_BREAKER_THRESHOLD, LLM_BREAKER_COOLDOWN_SECONDS)
+# Retries happen in the limiter, so the SDK's own are off
+client = RateLimitedClient(openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0), llm_limiter)
+async_client = AsyncRateLimitedClient(openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0), llm_limiter)  # Used by the non-blocking API path
 if not os.getenv("OPENAI_API_KEY"):
-    st.error("OPENAI_API_KEY not set in environment variables!")
-    st.stop()
+    print("⚠️  OPENAI_API_KEY not set in environment variables!")
 
 # Constants (e.g., for scoring rules)
 MAX_RESPONSE_TIME_SECONDS = 120
-VERIFICATION_ELEMENTS = ['account_or_phone', 'name', 'address']
\ No newline at end of file
+VERIFICATION_ELEMENTS = ['account_or_phone', 'name', 'address']
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))  # In-flight completions on the async path
+LLM_RESPONSE_FORMAT = os.getenv("LLM_RESPONSE_FORMAT", "text")  # "json_object" (JSON mode) or "json_schema" (structured outputs)
+LLM_SECTION_PROMPTS = os.getenv("LLM_SECTION_PROMPTS", "0") == "1"  # One concurrent sub-prompt per KPI on the async paths instead of one prompt
+BATCH_PRECHECK_WORKERS = int(os.getenv("BATCH_PRECHECK_WORKERS", str(os.cpu_count() or 1)))  # Processes for batch pre-checks
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "8000"))  # Longer transcripts are compacted, then trimmed to fit
+
+# Tiered routing for model "auto": each tier runs only if the previous one disagreed with the pre-checks or returned incomplete JSON
+ROUTING_TIERS = [model.strip() for model in os.getenv("ROUTING_TIERS", "gpt-4o-mini,gpt-4o").split(",") if model.strip()]
+ROUTING_MAX_DISAGREEMENTS = int(os.getenv("ROUTING_MAX_DISAGREEMENTS", "1"))  # KPI sections allowed to contradict the pre-checks
+
+# Background analysis jobs (SQLite-backed queue in the analyses DB)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_BACKOFF_SECONDS = float(os.getenv("JOB_BACKOFF_SECONDS", "2.0"))
+
+# Analysis result cache (in-process LRU in front of a SQLite table next to the analyses DB)
+ANALYSIS_CACHE_ENABLED = os.getenv("ANALYSIS_CACHE_ENABLED", "1") == "1"
+ANALYSIS_CACHE_PATH = os.getenv("ANALYSIS_CACHE_PATH", "data/analysis_cache.db")
+ANALYSIS_CACHE_TTL_SECONDS = int(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+ANALYSIS_CACHE_MEMORY_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MEMORY_ENTRIES", "512"))
+ANALYSIS_CACHE_MAX_ROWS = int(os.getenv("ANALYSIS_CACHE_MAX_ROWS", "50000"))
\ No newline at end of file
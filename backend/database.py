@@ -0,0 +1,572 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from codec import BlobCodec
+
+DB_PATH = os.getenv("QA_DB_PATH", "data/qa_analyses.db")
+# Compression for transcripts, artifacts and results: auto (zstd if installed, else zlib), zstd, zlib or none
+STORAGE_CODEC = os.getenv("QA_STORAGE_CODEC", "auto")
+
+# WAL lets dashboard reads proceed while an analysis insert is committing; NORMAL sync is durable
+# across application crashes in WAL mode and avoids an fsync per commit.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-20000",  # ~20 MB page cache per connection
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+_local = threading.local()
+_connections: List[sqlite3.Connection] = []
+_connections_lock = threading.Lock()
+_codec: Optional[BlobCodec] = None
+_codec_lock = threading.Lock()
+
+def get_connection() -> sqlite3.Connection:
+    """Per-thread persistent connection (the worker threads of asyncio.to_thread form the pool).
+
+    Connections run in autocommit mode; group writes with transaction(). SQL strings are constants,
+    so sqlite3's per-connection statement cache reuses the prepared statements.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        os.makedirs(os.path.dirname(DB_PATH) or '.', exist_ok=True)
+        conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None,
+                               check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        _local.conn = conn
+        with _connections_lock:
+            _connections.append(conn)
+    return conn
+
+@contextmanager
+def transaction(immediate: bool = True) -> Iterator[sqlite3.Connection]:
+    """BEGIN IMMEDIATE ... COMMIT on this thread's connection (rolled back on error, including a
+    failed COMMIT, so the pooled connection never stays inside a transaction)."""
+    conn = get_connection()
+    conn.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+    try:
+        yield conn
+        conn.execute('COMMIT')
+    except BaseException:
+        if conn.in_transaction:  # SQLite may already have rolled back (e.g. SQLITE_FULL)
+            conn.execute('ROLLBACK')
+        raise
+
+def close_all() -> None:
+    global _codec
+    with _connections_lock:
+        for conn in _connections:
+            conn.close()
+        _connections.clear()
+    _local.__dict__.clear()
+    _codec = None
+
+PREVIEW_CHARS = 100
+
+def _preview(transcript: str) -> str:
+    return transcript[:PREVIEW_CHARS] + "..." if len(transcript) > PREVIEW_CHARS else transcript
+
+def _migrate_listing_indexes(conn: sqlite3.Connection) -> None:
+    """Store the listing preview and index the columns the listing orders and filters by."""
+    conn.execute('ALTER TABLE analyses ADD COLUMN transcript_preview TEXT')
+    conn.create_function('qa_preview', 1, _preview)
+    conn.execute('UPDATE analyses SET transcript_preview = qa_preview(transcript_text)')
+    # id is the rowid, so each index also orders ties by id
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_analyses_created_at ON analyses(created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_analyses_model_created_at ON analyses(model_used, created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_analyses_percentage_score ON analyses(percentage_score)')
+
+# Dashboard rollups: one running-totals row plus one row per UTC day, both bumped in the insert's
+# transaction. `scored` counts non-NULL scores so score_sum / scored matches AVG(percentage_score).
+STATS_COLUMNS = '''
+    analyses INTEGER NOT NULL DEFAULT 0,
+    scored INTEGER NOT NULL DEFAULT 0,
+    score_sum REAL NOT NULL DEFAULT 0,
+    excellent INTEGER NOT NULL DEFAULT 0,
+    good INTEGER NOT NULL DEFAULT 0,
+    average INTEGER NOT NULL DEFAULT 0,
+    poor INTEGER NOT NULL DEFAULT 0
+'''
+
+STATS_BUCKETS = '''
+    COUNT(CASE WHEN percentage_score >= 80 THEN 1 END),
+    COUNT(CASE WHEN percentage_score >= 60 AND percentage_score < 80 THEN 1 END),
+    COUNT(CASE WHEN percentage_score >= 40 AND percentage_score < 60 THEN 1 END),
+    COUNT(CASE WHEN percentage_score < 40 THEN 1 END)
+'''
+
+STATS_ACCUMULATE = '''
+    analyses = analyses + excluded.analyses,
+    scored = scored + excluded.scored,
+    score_sum = score_sum + excluded.score_sum,
+    excellent = excellent + excluded.excellent,
+    good = good + excluded.good,
+    average = average + excluded.average,
+    poor = poor + excluded.poor
+'''
+
+def _migrate_dashboard_rollups(conn: sqlite3.Connection) -> None:
+    conn.execute(f'CREATE TABLE IF NOT EXISTS analysis_stats_total (id INTEGER PRIMARY KEY CHECK (id = 1), {STATS_COLUMNS})')
+    conn.execute(f'CREATE TABLE IF NOT EXISTS analysis_stats_daily (day TEXT PRIMARY KEY, {STATS_COLUMNS})')
+    _rebuild_stats(conn)
+
+# Debug fields of an analysis result kept out of analyses.analysis_results; together with the raw
+# transcript they live compressed in analysis_artifacts and are only read when asked for.
+ARTIFACT_FIELDS = ('sent_prompt', 'raw_response', 'masked_transcript')
+TRANSCRIPT_ARTIFACT = 'transcript'
+
+# Which trained dictionary compresses what: prompts embed the masked transcript, so they share its dictionary
+ARTIFACT_KINDS = {
+    TRANSCRIPT_ARTIFACT: 'transcript',
+    'masked_transcript': 'transcript',
+    'sent_prompt': 'transcript',
+    'raw_response': 'result'
+}
+RESULT_KIND = 'result'
+
+def _load_dictionaries(codec: BlobCodec) -> None:
+    conn = get_connection()
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'compression_dictionaries'").fetchone():
+        for row in conn.execute('SELECT id, kind, codec, content FROM compression_dictionaries ORDER BY id'):
+            codec.register_dictionary(row['id'], row['kind'], row['codec'], row['content'])
+
+def get_codec() -> BlobCodec:
+    global _codec
+    with _codec_lock:
+        if _codec is None:
+            codec = BlobCodec(STORAGE_CODEC)
+            _load_dictionaries(codec)
+            _codec = codec
+        return _codec
+
+def _pack(text: str, kind: str):
+    return get_codec().encode(text, kind)
+
+def _unpack(blob) -> str:
+    codec = get_codec()
+    try:
+        return codec.decode(blob)
+    except KeyError:  # Dictionary trained by another process after we loaded ours
+        with _codec_lock:
+            _load_dictionaries(codec)
+        return codec.decode(blob)
+
+def _split_result(result: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    summary = {key: value for key, value in result.items() if key not in ARTIFACT_FIELDS}
+    artifacts = {key: result[key] for key in ARTIFACT_FIELDS if isinstance(result.get(key), str)}
+    return summary, artifacts
+
+def _store_artifacts(conn: sqlite3.Connection, analysis_id: int, artifacts: Dict[str, str]) -> None:
+    conn.executemany('INSERT OR REPLACE INTO analysis_artifacts (analysis_id, name, content) VALUES (?, ?, ?)',
+                     [(analysis_id, name, _pack(text, ARTIFACT_KINDS[name])) for name, text in artifacts.items()])
+
+def _migrate_artifact_store(conn: sqlite3.Connection, batch_size: int = 500) -> None:
+    """Move raw transcripts and debug fields out of the analyses rows.
+
+    transcript_text is left NULL rather than dropped so older readers still see the column; run
+    VACUUM afterwards to hand the freed pages back to the filesystem.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS analysis_artifacts (
+            analysis_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            content BLOB NOT NULL,
+            PRIMARY KEY (analysis_id, name)
+        ) WITHOUT ROWID
+    ''')
+    last_id = 0
+    while True:  # Paged by id so only one batch of transcripts and results is in memory
+        rows = conn.execute('''
+            SELECT id, transcript_text, analysis_results FROM analyses
+            WHERE id > ? AND (transcript_text IS NOT NULL OR analysis_results IS NOT NULL)
+            ORDER BY id LIMIT ?
+        ''', (last_id, batch_size)).fetchall()
+        if not rows:
+            return
+        for analysis_id, transcript, results in rows:
+            summary, artifacts = _split_result(json.loads(results)) if results else (None, {})
+            if transcript is not None:
+                artifacts[TRANSCRIPT_ARTIFACT] = transcript
+            _store_artifacts(conn, analysis_id, artifacts)
+            conn.execute('UPDATE analyses SET transcript_text = NULL, analysis_results = ? WHERE id = ?',
+                         (json.dumps(summary) if summary is not None else None, analysis_id))
+        last_id = rows[-1][0]
+
+TRAINING_SAMPLES = 2000  # Newest rows per dictionary kind used for training
+
+def _training_samples(conn: sqlite3.Connection, kind: str, limit: int) -> List[str]:
+    names = [name for name, name_kind in ARTIFACT_KINDS.items() if name_kind == kind]
+    samples = [_unpack(row[0]) for row in conn.execute(f'''
+        SELECT content FROM analysis_artifacts WHERE name IN ({', '.join('?' * len(names))})
+        ORDER BY analysis_id DESC LIMIT ?
+    ''', (*names, limit))]
+    if kind == RESULT_KIND:
+        samples += [_unpack(row[0]) for row in conn.execute(
+            'SELECT analysis_results FROM analyses WHERE analysis_results IS NOT NULL ORDER BY id DESC LIMIT ?', (limit,))]
+    return samples
+
+def _train_dictionaries(conn: sqlite3.Connection, limit: int) -> Dict[str, int]:
+    """Train and register a new dictionary per kind from the newest rows; returns the new ids."""
+    codec = get_codec()
+    trained = {}
+    for kind in sorted(set(ARTIFACT_KINDS.values())):
+        content = codec.train(_training_samples(conn, kind, limit))
+        if content is None:
+            continue
+        dictionary_id = conn.execute('INSERT INTO compression_dictionaries (kind, codec, content) VALUES (?, ?, ?)',
+                                     (kind, codec.codec, content)).lastrowid
+        codec.register_dictionary(dictionary_id, kind, codec.codec, content)
+        trained[kind] = dictionary_id
+    return trained
+
+def _recompress(conn: sqlite3.Connection, batch_size: int = 500) -> int:
+    """Re-encode every stored blob with the current codec and newest dictionaries."""
+    last_id, rewritten = 0, 0
+    while True:
+        ids = [row[0] for row in conn.execute('SELECT id FROM analyses WHERE id > ? ORDER BY id LIMIT ?', (last_id, batch_size))]
+        if not ids:
+            return rewritten
+        placeholders = ', '.join('?' * len(ids))
+        artifacts = conn.execute(f'SELECT analysis_id, name, content FROM analysis_artifacts WHERE analysis_id IN ({placeholders})', ids).fetchall()
+        conn.executemany('UPDATE analysis_artifacts SET content = ? WHERE analysis_id = ? AND name = ?',
+                         [(_pack(_unpack(content), ARTIFACT_KINDS[name]), analysis_id, name) for analysis_id, name, content in artifacts])
+        results = conn.execute(f'SELECT id, analysis_results FROM analyses WHERE id IN ({placeholders}) AND analysis_results IS NOT NULL', ids).fetchall()
+        conn.executemany('UPDATE analyses SET analysis_results = ? WHERE id = ?',
+                         [(_pack(_unpack(blob), RESULT_KIND), analysis_id) for analysis_id, blob in results])
+        rewritten += len(artifacts) + len(results)
+        last_id = ids[-1]
+
+def _migrate_compressed_storage(conn: sqlite3.Connection) -> None:
+    """Dictionary-compress results and artifacts (transcripts included) with dictionaries trained on this database."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS compression_dictionaries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            codec TEXT NOT NULL,
+            content BLOB NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    _train_dictionaries(conn, TRAINING_SAMPLES)
+    _recompress(conn)
+
+def _passed(result: Dict[str, Any], pre_key: str, *flags: str) -> Optional[bool]:
+    pre = result.get(pre_key)
+    if not isinstance(pre, dict) or any(flag not in pre for flag in flags):
+        return None
+    return all(bool(pre[flag]) for flag in flags)
+
+def _first_response_passed(result: Dict[str, Any]) -> Optional[bool]:
+    """Within 2 minutes and the callback check; None for analyses stored before pre_callback was kept."""
+    within = _passed(result, 'pre_calculated', 'within_2_minutes')
+    if not within:
+        return within
+    if 'pre_callback' not in result:
+        return None
+    return bool(result['pre_callback'])
+
+# Per KPI section: default max score and its pre-check verdict (the condition the fallback scoring uses)
+KPI_SECTIONS = {
+    'first_response_analysis': (5, _first_response_passed),
+    'security_verification_analysis': (10, lambda r: _passed(r, 'pre_verification', 'all_obtained') and r['pre_verification'].get('num_asked', 0) >= 3),
+    'customer_needs_analysis': (5, lambda r: _passed(r, 'pre_reason', 'identified_reason', 'issue_resolved')),
+    'interaction_analysis': (5, lambda r: _passed(r, 'pre_interaction', 'all_met')),
+    'time_respect_analysis': (10, lambda r: _passed(r, 'pre_time_respect', 'all_met')),
+    'needs_identification_analysis': (5, lambda r: _passed(r, 'pre_needs', 'no_redundant_ask')),
+    'transfer_analysis': (10, lambda r: _passed(r, 'pre_transfer', 'asked_voice'))
+}
+
+def _kpi_rows(analysis_id: int, result: Dict[str, Any]) -> List[tuple]:
+    rows = []
+    for kpi, (default_max, pre_check) in KPI_SECTIONS.items():
+        section = result.get(kpi)
+        if not isinstance(section, dict):
+            continue
+        try:
+            score = int(section.get('score', 0))
+            max_score = int(section.get('max_score', default_max))
+        except (TypeError, ValueError):
+            continue
+        passed = pre_check(result)
+        from_fallback = 'error' in result or kpi in result.get('fallback_sections', ())
+        rows.append((analysis_id, kpi, score, max_score, None if passed is None else int(passed), int(from_fallback)))
+    return rows
+
+def _store_kpis(conn: sqlite3.Connection, analysis_id: int, result: Dict[str, Any]) -> None:
+    conn.executemany('''
+        INSERT OR REPLACE INTO analysis_kpis (analysis_id, kpi, score, max_score, pre_check_passed, from_fallback)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', _kpi_rows(analysis_id, result))
+
+def _migrate_kpi_table(conn: sqlite3.Connection) -> None:
+    """One row per (analysis, KPI section) so breakdowns are SQL aggregates instead of JSON scans."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS analysis_kpis (
+            analysis_id INTEGER NOT NULL,
+            kpi TEXT NOT NULL,
+            score INTEGER NOT NULL,
+            max_score INTEGER NOT NULL,
+            pre_check_passed INTEGER,
+            from_fallback INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (analysis_id, kpi)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_analysis_kpis_kpi_score ON analysis_kpis(kpi, score)')
+    # Streams the backfill; only analysis_kpis is written while the analyses cursor is open
+    for analysis_id, blob in conn.execute('SELECT id, analysis_results FROM analyses WHERE analysis_results IS NOT NULL'):
+        _store_kpis(conn, analysis_id, json.loads(_unpack(blob)))
+
+def _migrate_first_response_callback(conn: sqlite3.Connection) -> None:
+    """The first-response verdict now also needs the callback check, which older results don't carry:
+    their passes become unknown (a fail on response time stands)."""
+    conn.execute("UPDATE analysis_kpis SET pre_check_passed = NULL WHERE kpi = 'first_response_analysis' AND pre_check_passed = 1")
+
+# Applied in order; PRAGMA user_version records how many have run
+MIGRATIONS = (
+    _migrate_listing_indexes,
+    _migrate_dashboard_rollups,
+    _migrate_artifact_store,
+    _migrate_compressed_storage,
+    _migrate_kpi_table,
+    _migrate_first_response_callback,
+)
+
+def migrate() -> int:
+    """Apply pending migrations, each in its own transaction. Returns the schema version."""
+    version = get_connection().execute('PRAGMA user_version').fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        with transaction() as conn:
+            migration(conn)
+            conn.execute(f'PRAGMA user_version = {number}')
+        print(f"🔧 Applied migration {number}: {migration.__name__}")
+        version = number
+    return version
+
+def init_db() -> None:
+    get_connection().execute('''
+        CREATE TABLE IF NOT EXISTS analyses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transcript_text TEXT,
+            model_used TEXT,
+            overall_score INTEGER,
+            max_score INTEGER,
+            percentage_score REAL,
+            analysis_results TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    migrate()
+
+def _insert_analysis(conn: sqlite3.Connection, transcript: str, model: str, result: Dict[str, Any]) -> int:
+    overall = result.get('overall_scores', {})
+    summary, artifacts = _split_result(result)
+    artifacts[TRANSCRIPT_ARTIFACT] = transcript
+    cursor = conn.execute('''
+        INSERT INTO analyses
+        (transcript_preview, model_used, overall_score, max_score, percentage_score, analysis_results)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (
+        _preview(transcript),
+        result.get('model_used', model),  # Routed ('auto') analyses are stored under the tier that scored them
+        overall.get('total_score', 0),
+        overall.get('max_possible_score', 45),
+        overall.get('percentage_score', 0),
+        _pack(json.dumps(summary), RESULT_KIND)
+    ))
+    _store_artifacts(conn, cursor.lastrowid, artifacts)
+    _store_kpis(conn, cursor.lastrowid, result)
+    _record_stats(conn, cursor.lastrowid)
+    return cursor.lastrowid
+
+def _record_stats(conn: sqlite3.Connection, analysis_id: int) -> None:
+    """Fold one freshly inserted analysis into the rollups (same transaction as the insert)."""
+    for table, target, key in (('analysis_stats_total', 'id', '1'), ('analysis_stats_daily', 'day', 'date(created_at)')):
+        conn.execute(f'''
+            INSERT INTO {table}
+            SELECT {key}, COUNT(*), COUNT(percentage_score), TOTAL(percentage_score), {STATS_BUCKETS}
+            FROM analyses WHERE id = ?
+            ON CONFLICT({target}) DO UPDATE SET {STATS_ACCUMULATE}
+        ''', (analysis_id,))
+
+def _rebuild_stats(conn: sqlite3.Connection) -> None:
+    conn.execute('DELETE FROM analysis_stats_total')
+    conn.execute('DELETE FROM analysis_stats_daily')
+    conn.execute(f'''
+        INSERT INTO analysis_stats_total
+        SELECT 1, COUNT(*), COUNT(percentage_score), TOTAL(percentage_score), {STATS_BUCKETS}
+        FROM analyses
+    ''')
+    conn.execute(f'''
+        INSERT INTO analysis_stats_daily
+        SELECT date(created_at), COUNT(*), COUNT(percentage_score), TOTAL(percentage_score), {STATS_BUCKETS}
+        FROM analyses GROUP BY date(created_at)
+    ''')
+
+def rebuild_stats() -> None:
+    """Recompute the dashboard rollups from the analyses table (after backfills or manual edits)."""
+    with transaction() as conn:
+        _rebuild_stats(conn)
+
+def insert_analysis(transcript: str, model: str, result: Dict[str, Any]) -> int:
+    with transaction() as conn:
+        return _insert_analysis(conn, transcript, model, result)
+
+def insert_analyses(rows: Iterable[Tuple[str, str, Dict[str, Any]]]) -> List[int]:
+    """Insert (transcript, model, result) rows in a single transaction."""
+    with transaction() as conn:
+        return [_insert_analysis(conn, transcript, model, result) for transcript, model, result in rows]
+
+def list_analyses(limit: int, offset: int = 0, before_id: Optional[int] = None,
+                  after_created_at: Optional[str] = None, model: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Newest-first page of analyses.
+
+    before_id is a keyset cursor: rows strictly older, in (created_at, id) order, than that analysis.
+    Unlike offset it walks the created_at index from the cursor, so every page costs O(limit).
+    after_created_at restricts to rows newer than a timestamp (e.g. polling for new analyses).
+    """
+    clauses, params = [], []
+    if before_id is not None:
+        clauses.append('(created_at, id) < (SELECT created_at, id FROM analyses WHERE id = ?)')
+        params.append(before_id)
+    if after_created_at is not None:
+        clauses.append('created_at > ?')
+        params.append(after_created_at)
+    if model is not None:
+        clauses.append('model_used = ?')
+        params.append(model)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    rows = get_connection().execute(f'''
+        SELECT id, transcript_preview, model_used, overall_score, max_score,
+               percentage_score, created_at
+        FROM analyses
+        {where}
+        ORDER BY created_at DESC, id DESC
+        LIMIT ? OFFSET ?
+    ''', (*params, limit, offset)).fetchall()
+    return [{
+        "id": row[0],
+        "transcript_preview": row[1],
+        "model_used": row[2],
+        "overall_score": row[3],
+        "max_score": row[4],
+        "percentage_score": row[5],
+        "created_at": row[6]
+    } for row in rows]
+
+def get_analysis_results(analysis_id: int, include_artifacts: bool = False) -> Optional[Dict[str, Any]]:
+    """Scored result of an analysis; the debug fields are only loaded with include_artifacts."""
+    conn = get_connection()
+    row = conn.execute('SELECT analysis_results FROM analyses WHERE id = ?', (analysis_id,)).fetchone()
+    if not row:
+        return None
+    result = json.loads(_unpack(row[0]))
+    if include_artifacts:
+        for name, content in conn.execute(
+                f"SELECT name, content FROM analysis_artifacts WHERE analysis_id = ? AND name IN ({', '.join('?' * len(ARTIFACT_FIELDS))})",
+                (analysis_id, *ARTIFACT_FIELDS)):
+            result[name] = _unpack(content)
+    return result
+
+def get_artifact(analysis_id: int, name: str) -> Optional[str]:
+    row = get_connection().execute('SELECT content FROM analysis_artifacts WHERE analysis_id = ? AND name = ?',
+                                   (analysis_id, name)).fetchone()
+    return _unpack(row[0]) if row else None
+
+def train_dictionaries(samples: int = TRAINING_SAMPLES, recompress: bool = False) -> Dict[str, int]:
+    """Retrain the compression dictionaries on the newest rows; older blobs keep decoding with theirs."""
+    with transaction() as conn:
+        trained = _train_dictionaries(conn, samples)
+        if recompress:
+            _recompress(conn)
+    return trained
+
+def kpi_summary(since: Optional[str] = None, model: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Per-KPI averages and pre-check pass rates, optionally limited to analyses since a timestamp / of a model."""
+    clauses, params = [], []
+    if since is not None:
+        clauses.append('a.created_at >= ?')
+        params.append(since)
+    if model is not None:
+        clauses.append('a.model_used = ?')
+        params.append(model)
+    source = 'analysis_kpis k'
+    if clauses:
+        source += f" JOIN analyses a ON a.id = k.analysis_id WHERE {' AND '.join(clauses)}"
+    rows = get_connection().execute(f'''
+        SELECT k.kpi, COUNT(*), AVG(k.score), MAX(k.max_score), AVG(100.0 * k.score / k.max_score),
+               AVG(k.pre_check_passed), AVG(k.from_fallback)
+        FROM {source}
+        GROUP BY k.kpi
+    ''', params).fetchall()
+    by_kpi = {row[0]: row for row in rows}
+    return [{
+        "kpi": kpi,
+        "analyses": by_kpi[kpi][1],
+        "average_score": round(by_kpi[kpi][2], 2),
+        "max_score": by_kpi[kpi][3],
+        "average_percentage": round(by_kpi[kpi][4] or 0.0, 2),
+        "pre_check_pass_rate": round(by_kpi[kpi][5], 4) if by_kpi[kpi][5] is not None else None,
+        "fallback_rate": round(by_kpi[kpi][6], 4)
+    } for kpi in KPI_SECTIONS if kpi in by_kpi]
+
+def dashboard_stats() -> Dict[str, Any]:
+    """Read the rollups instead of scanning analyses; cost does not grow with the table."""
+    conn = get_connection()
+    total = conn.execute('''
+        SELECT analyses, scored, score_sum, excellent, good, average, poor FROM analysis_stats_total
+    ''').fetchone()
+    total_analyses, scored, score_sum, excellent, good, average, poor = total if total else (0,) * 7
+    avg_score = score_sum / scored if scored else 0.0
+
+    # Recent analyses (last 7 days): whole days from the rollup, plus the partial boundary day
+    # counted exactly through the created_at index
+    recent_analyses = conn.execute('''
+        SELECT
+            (SELECT TOTAL(analyses) FROM analysis_stats_daily WHERE day > date('now', '-7 days')) +
+            (SELECT COUNT(*) FROM analyses
+             WHERE created_at >= datetime('now', '-7 days') AND created_at < date('now', '-6 days'))
+    ''').fetchone()[0]
+
+    return {
+        "total_analyses": total_analyses,
+        "average_score": round(avg_score, 2),
+        "recent_analyses": int(recent_analyses),
+        "score_distribution": {
+            "excellent": excellent,
+            "good": good,
+            "average": average,
+            "poor": poor
+        }
+    }
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="QA analyses database maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("migrate", help="apply pending schema migrations")
+    commands.add_parser("rebuild-stats", help="recompute the dashboard rollup tables from analyses")
+    train = commands.add_parser("train-dictionaries", help="retrain the compression dictionaries on recent rows")
+    train.add_argument("--samples", type=int, default=TRAINING_SAMPLES)
+    train.add_argument("--recompress", action="store_true", help="re-encode all stored rows with the new dictionaries")
+
+    args = parser.parse_args()
+    if args.command == "migrate":
+        init_db()
+        print(f"✅ Schema at version {migrate()}")
+    elif args.command == "rebuild-stats":
+        init_db()
+        rebuild_stats()
+        print("✅ Dashboard stats rebuilt")
+    elif args.command == "train-dictionaries":
+        init_db()
+        trained = train_dictionaries(args.samples, args.recompress)
+        print(f"✅ Trained dictionaries: {trained or 'none (not enough rows)'}")
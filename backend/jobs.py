@@ -0,0 +1,203 @@
+import asyncio
+import random
+import sqlite3
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import database
+
+TERMINAL_STATUSES = ('succeeded', 'failed')
+
+class JobQueue:
+    """Durable analysis job queue: jobs live in a SQLite table and a pool of asyncio workers runs them.
+
+    Submitting only inserts a row, so request handlers return immediately. Workers claim the oldest
+    due job inside a write transaction, run `analyze`, and persist the result through `store`. A result
+    carrying 'api_error' (or an exception) is retried with exponential backoff and jitter until
+    max_attempts; jobs left 'running' by a crashed process are re-queued on start. The transcript is
+    dropped from the job row once the job is finished.
+    """
+
+    def __init__(self,
+                 analyze: Callable[[str, str], Awaitable[Dict[str, Any]]],
+                 store: Callable[[str, str, Dict[str, Any]], int],
+                 workers: int = 4, max_attempts: int = 3,
+                 backoff_seconds: float = 2.0, poll_seconds: float = 1.0):
+        self.analyze = analyze
+        self.store = store
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.poll_seconds = poll_seconds
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def init_schema(self) -> None:
+        conn = database.get_connection()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS analysis_jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                transcript TEXT,
+                model TEXT,
+                attempts INTEGER DEFAULT 0,
+                max_attempts INTEGER,
+                next_run_at REAL,
+                analysis_id INTEGER,
+                error TEXT,
+                created_at REAL,
+                started_at REAL,
+                finished_at REAL,
+                updated_at REAL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_analysis_jobs_due ON analysis_jobs(status, next_run_at)')
+        # Jobs finished before transcripts were dropped on completion
+        conn.execute("UPDATE analysis_jobs SET transcript = NULL WHERE status IN ('succeeded', 'failed') AND transcript IS NOT NULL")
+
+    async def start(self) -> None:
+        await asyncio.to_thread(self.init_schema)
+        requeued = await asyncio.to_thread(self._requeue_orphans)
+        if requeued:
+            print(f"♻️  Re-queued {requeued} interrupted analysis jobs")
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        print(f"✅ Job queue started with {self.workers} workers")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, transcript: str, model: str) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        await asyncio.to_thread(self._insert, job_id, transcript, model)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return await self.get(job_id, include_result=False)
+
+    async def get(self, job_id: str, include_result: bool = True) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._load, job_id, include_result)
+
+    def _insert(self, job_id: str, transcript: str, model: str) -> None:
+        now = time.time()
+        conn = database.get_connection()
+        conn.execute('''
+            INSERT INTO analysis_jobs (id, status, transcript, model, attempts, max_attempts, next_run_at, created_at, updated_at)
+            VALUES (?, 'queued', ?, ?, 0, ?, ?, ?, ?)
+        ''', (job_id, transcript, model, self.max_attempts, now, now, now))
+
+    def _load(self, job_id: str, include_result: bool) -> Optional[Dict[str, Any]]:
+        conn = database.get_connection()
+        row = conn.execute('''
+            SELECT id, status, model, attempts, max_attempts, next_run_at, analysis_id, error,
+                   created_at, started_at, finished_at, updated_at
+            FROM analysis_jobs WHERE id = ?
+        ''', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        if include_result and job['analysis_id'] is not None:
+            job['result'] = database.get_analysis_results(job['analysis_id'])
+        return job
+
+    def _requeue_orphans(self) -> int:
+        conn = database.get_connection()
+        count = conn.execute('''
+            UPDATE analysis_jobs SET status = 'queued', next_run_at = ?, updated_at = ?
+            WHERE status = 'running'
+        ''', (time.time(), time.time())).rowcount
+        return count
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        """Atomically move the oldest due job to 'running' and return it."""
+        now = time.time()
+        with database.transaction() as conn:
+            row = conn.execute('''
+                SELECT id, transcript, model, attempts, max_attempts FROM analysis_jobs
+                WHERE status = 'queued' AND next_run_at <= ?
+                ORDER BY next_run_at LIMIT 1
+            ''', (now,)).fetchone()
+            if row is not None:
+                conn.execute('''
+                    UPDATE analysis_jobs SET status = 'running', attempts = attempts + 1, started_at = ?, updated_at = ?
+                    WHERE id = ?
+                ''', (now, now, row['id']))
+            return row
+
+    def _finish(self, job_id: str, status: str, analysis_id: Optional[int], error: Optional[str]) -> None:
+        now = time.time()
+        conn = database.get_connection()
+        conn.execute('''
+            UPDATE analysis_jobs SET status = ?, analysis_id = ?, error = ?, transcript = NULL, finished_at = ?, updated_at = ?
+            WHERE id = ?
+        ''', (status, analysis_id, error, now, now, job_id))
+
+    def _schedule_retry(self, job_id: str, delay: float, error: str) -> None:
+        now = time.time()
+        conn = database.get_connection()
+        conn.execute('''
+            UPDATE analysis_jobs SET status = 'queued', next_run_at = ?, error = ?, updated_at = ?
+            WHERE id = ?
+        ''', (now + delay, error, now, job_id))
+
+    def retry_delay(self, attempts: int) -> float:
+        """Exponential backoff with +/-50% jitter: base, 2*base, 4*base, ..."""
+        return self.backoff_seconds * (2 ** (attempts - 1)) * (0.5 + random.random())
+
+    async def _worker(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                job = await asyncio.to_thread(self._claim)
+            except sqlite3.OperationalError as e:
+                print(f"⚠️  Job claim failed: {e}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._run(job)
+            except Exception as e:  # e.g. storing the result failed; the worker must survive it
+                await self._recover(job, e)
+
+    async def _recover(self, job: sqlite3.Row, error: Exception) -> None:
+        """A job whose run raised: retry it with the usual backoff, or fail it once out of attempts."""
+        job_id, attempts = job['id'], job['attempts'] + 1
+        error = f"{type(error).__name__}: {error}"
+        try:
+            if attempts < job['max_attempts']:
+                delay = self.retry_delay(attempts)
+                print(f"🔁 Job {job_id} attempt {attempts} raised ({error}); retrying in {delay:.1f}s")
+                await asyncio.to_thread(self._schedule_retry, job_id, delay, error)
+            else:
+                await asyncio.to_thread(self._finish, job_id, 'failed', None, error)
+                print(f"❌ Job {job_id} failed after {attempts} attempt(s): {error}")
+        except Exception as e:  # Database unavailable; the job stays 'running' until re-queued on restart
+            print(f"⚠️  Could not record the outcome of job {job_id}: {e}")
+
+    async def _run(self, job: sqlite3.Row) -> None:
+        job_id, attempts = job['id'], job['attempts'] + 1
+        try:
+            result = await self.analyze(job['transcript'], job['model'])
+            error = result.get('api_error')
+        except Exception as e:
+            result, error = None, str(e)
+
+        if error and attempts < job['max_attempts']:
+            delay = self.retry_delay(attempts)
+            print(f"🔁 Job {job_id} attempt {attempts} failed ({error}); retrying in {delay:.1f}s")
+            await asyncio.to_thread(self._schedule_retry, job_id, delay, error)
+            return
+
+        analysis_id = None
+        if result is not None:
+            analysis_id = await asyncio.to_thread(self.store, job['transcript'], job['model'], result)
+        status = 'failed' if error else 'succeeded'
+        await asyncio.to_thread(self._finish, job_id, status, analysis_id, error)
+        print(f"{'❌' if error else '✅'} Job {job_id} {status} after {attempts} attempt(s)")
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Load test for the analyze endpoint against a local stub LLM server.
+
+    # 1. Stub OpenAI-compatible server that answers every completion after a fixed delay
+    python load_test.py stub-llm --port 9100 --latency 2.0
+
+    # 2. Backend pointed at the stub
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 OPENAI_API_KEY=stub python main.py
+
+    # 3. Fire concurrent analyses and watch /health latency while they are in flight
+    python load_test.py run --requests 50 --concurrency 50
+
+With a non-blocking analyze path, wall time stays close to requests / LLM_MAX_CONCURRENCY * latency
+and /health keeps answering in milliseconds; with a blocking path both grow with the request count.
+
+Rate limiting: the stub can enforce a requests-per-minute quota and inject random 429s (both with
+Retry-After). Point a backend with LLM_RPM_LIMIT at the quota and send one large batch:
+
+    python load_test.py stub-llm --quota-rpm 120 --error-rate 0.05 --latency 1.0 --latency-jitter 0.5
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 OPENAI_API_KEY=stub LLM_RPM_LIMIT=120 ANALYSIS_CACHE_ENABLED=0 python main.py
+    python load_test.py batch --transcripts 240
+
+The batch should complete at about the quota (120/min here) with few quota 429s and no failed items;
+the stub prints what it served and rejected every 10 seconds.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import math
+import random
+import statistics
+import time
+
+import httpx
+
+STUB_RESULT = {
+    "first_response_analysis": {"response_time_seconds": 30, "within_2_minutes": True, "callback_requested": "true", "score": 5, "max_score": 5, "reasoning": "stub"},
+    "security_verification_analysis": {"agent_asked_for_combo": "true", "num_elements_asked": 3, "customer_provided_all": "true", "record_aligned": "true", "score": 10, "max_score": 10, "reasoning": "stub"},
+    "customer_needs_analysis": {"identified_reason": "true", "issue_resolved": "true", "score": 5, "max_score": 5, "reasoning": "stub"},
+    "interaction_analysis": {"appropriate_tone": "true", "accepts_responsibility": "false", "responsibility_context_present": "false", "sets_expectation": "false", "score": 0, "max_score": 5, "reasoning": "stub"},
+    "time_respect_analysis": {"check_ins_met": "true", "no_idle": "true", "score": 10, "max_score": 10, "reasoning": "stub"},
+    "needs_identification_analysis": {"no_redundant_ask": "true", "score": 5, "max_score": 5, "reasoning": "stub"},
+    "transfer_analysis": {"asked_voice_services": "true", "score": 10, "max_score": 10, "reasoning": "stub"},
+    "overall_scores": {"total_score": 45, "max_possible_score": 45, "percentage_score": 100}
+}
+
+SAMPLE_TRANSCRIPT = """( 0 s ): System: Chat started
+( 45 s ): A: Hello, thank you for contacting support. May I have a callback number in case we get disconnected?
+( 1 m 10 s ): Tech Bob: CBR 5551234567
+( 1 m 40 s ): A: Could you please provide the account number or telephone number, and the name and address associated with the account?
+( 2 m 5 s ): Tech Bob: Account # 12345678, JOHN SMITH, 123 MAIN ST
+( 3 m 0 s ): A: Thanks, what is the reason for contact today?
+( 3 m 30 s ): Tech Bob: Customer has no dial tone
+( 6 m 0 s ): A: I reset the port, the problem is fixed. Do you need any voice services provisioned?
+( 6 m 30 s ): Tech Bob: No, all set"""
+
+def stub_completion(model: str) -> dict:
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": json.dumps(STUB_RESULT)}}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    }
+
+def rate_limit_response(retry_after: float, message: str) -> bytes:
+    payload = json.dumps({"error": {"message": message, "type": "requests", "code": "rate_limit_exceeded"}}).encode()
+    return (b"HTTP/1.1 429 Too Many Requests\r\nContent-Type: application/json\r\n"
+            b"Retry-After: " + str(math.ceil(retry_after)).encode() + b"\r\n"
+            b"Retry-After-Ms: " + str(int(retry_after * 1000)).encode() + b"\r\n"
+            b"Content-Length: " + str(len(payload)).encode() + b"\r\nConnection: close\r\n\r\n" + payload)
+
+async def serve_stub_llm(host: str, port: int, latency: float, latency_jitter: float = 0.0,
+                         quota_rpm: int = 0, error_rate: float = 0.0) -> None:
+    """Minimal HTTP/1.1 server answering POST .../chat/completions after `latency` (+ up to
+    `latency_jitter`) seconds. Requests beyond `quota_rpm` (replenished continuously, like the
+    provider's limits), and a random `error_rate` share of the rest, get a 429 with Retry-After instead."""
+    quota = {"available": float(quota_rpm), "updated": time.monotonic()}
+    counts = collections.Counter()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+            headers = {}
+            for line in head.decode("latin-1").split("\r\n")[1:]:
+                if ":" in line:
+                    key, value = line.split(":", 1)
+                    headers[key.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            model = json.loads(body or b"{}").get("model", "stub")
+            now = time.monotonic()
+            quota["available"] = min(quota_rpm, quota["available"] + (now - quota["updated"]) * quota_rpm / 60)
+            quota["updated"] = now
+            if quota_rpm and quota["available"] < 1:
+                counts["quota_429"] += 1
+                writer.write(rate_limit_response((1 - quota["available"]) * 60 / quota_rpm, f"Rate limit reached: {quota_rpm} RPM"))
+            elif random.random() < error_rate:
+                counts["injected_429"] += 1
+                writer.write(rate_limit_response(1.0, "Injected rate limit"))
+            else:
+                quota["available"] -= 1
+                await asyncio.sleep(latency + random.uniform(0, latency_jitter))
+                counts["served"] += 1
+                payload = json.dumps(stub_completion(model)).encode()
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Content-Length: " + str(len(payload)).encode() + b"\r\nConnection: close\r\n\r\n" + payload)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def report() -> None:
+        while True:
+            await asyncio.sleep(10)
+            if counts:
+                print(f"   served {counts['served']}, quota 429s {counts['quota_429']}, injected 429s {counts['injected_429']}")
+
+    server = await asyncio.start_server(handle, host, port)
+    print(f"🧪 Stub LLM listening on http://{host}:{port}/v1 (latency {latency}s +{latency_jitter}s, "
+          f"quota {quota_rpm or 'none'} RPM, error rate {error_rate})")
+    reporter = asyncio.create_task(report())
+    async with server:
+        await server.serve_forever()
+    reporter.cancel()
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+async def run_load(api: str, requests: int, concurrency: int, model: str) -> None:
+    limit = asyncio.Semaphore(concurrency)
+    latencies, health_latencies, failures = [], [], 0
+    done = asyncio.Event()
+
+    async with httpx.AsyncClient(base_url=api, timeout=600) as http:
+        async def analyze() -> None:
+            nonlocal failures
+            async with limit:
+                started = time.perf_counter()
+                response = await http.post("/api/analyze", json={"transcript": SAMPLE_TRANSCRIPT, "model": model})
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    failures += 1
+
+        async def probe_health() -> None:
+            while not done.is_set():
+                started = time.perf_counter()
+                await http.get("/health")
+                health_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0.1)
+
+        prober = asyncio.create_task(probe_health())
+        wall_start = time.perf_counter()
+        await asyncio.gather(*(analyze() for _ in range(requests)))
+        wall = time.perf_counter() - wall_start
+        done.set()
+        await prober
+
+    print("=" * 50)
+    print(f"📊 {requests} analyses, client concurrency {concurrency}, {failures} failed")
+    print(f"   Wall time: {wall:.2f}s ({requests / wall:.1f} req/s)")
+    print(f"   Analyze latency p50/p95/max: {percentile(latencies, 50):.2f}s / {percentile(latencies, 95):.2f}s / {max(latencies):.2f}s")
+    if health_latencies:
+        print(f"   /health under load p50/max: {statistics.median(health_latencies) * 1000:.1f}ms / {max(health_latencies) * 1000:.1f}ms")
+    print("=" * 50)
+
+async def run_batch(api: str, transcripts: int, model: str) -> None:
+    """One batch of identical transcripts (with the analysis cache off on the backend, each is a
+    completion), then the backend's rate limiter stats."""
+    async with httpx.AsyncClient(base_url=api, timeout=3600) as http:
+        started = time.perf_counter()
+        response = await http.post("/api/analyze/batch", json={"transcripts": [SAMPLE_TRANSCRIPT] * transcripts, "model": model})
+        wall = time.perf_counter() - started
+        batch = response.json()
+        llm = (await http.get("/api/llm/stats")).json()
+
+    print("=" * 50)
+    print(f"📊 {batch.get('count', 0)} analyses in {wall:.1f}s ({batch.get('count', 0) / wall * 60:.0f}/min), {batch.get('failed')} failed")
+    print(f"   Client limit: {llm.get('rpm_limit')} RPM, {llm.get('tpm_limit')} TPM; circuit {llm.get('circuit_state')}")
+    print(f"   Attempts {llm.get('attempts')} for {llm.get('requests')} requests: {llm.get('rate_limited')} rate limited, "
+          f"{llm.get('retries')} retried, {llm.get('failed')} failed")
+    print(f"   Waited {llm.get('throttle_wait_seconds')}s throttled, {llm.get('backoff_wait_seconds')}s backing off")
+    print("=" * 50)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    stub = commands.add_parser("stub-llm", help="run the stub OpenAI-compatible server")
+    stub.add_argument("--host", default="127.0.0.1")
+    stub.add_argument("--port", type=int, default=9100)
+    stub.add_argument("--latency", type=float, default=2.0, help="seconds before each completion returns")
+    stub.add_argument("--latency-jitter", type=float, default=0.0, help="extra random latency, up to this many seconds")
+    stub.add_argument("--quota-rpm", type=int, default=0, help="requests per minute before answering 429 (0: no quota)")
+    stub.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with an injected 429")
+
+    run = commands.add_parser("run", help="send concurrent analyses to the API")
+    run.add_argument("--api", default="http://localhost:8000")
+    run.add_argument("--requests", type=int, default=50)
+    run.add_argument("--concurrency", type=int, default=50)
+    run.add_argument("--model", default="gpt-4o-mini")
+
+    batch = commands.add_parser("batch", help="send one large batch and report throughput against the rate limits")
+    batch.add_argument("--api", default="http://localhost:8000")
+    batch.add_argument("--transcripts", type=int, default=240)
+    batch.add_argument("--model", default="gpt-4o-mini")
+
+    args = parser.parse_args()
+    if args.command == "stub-llm":
+        asyncio.run(serve_stub_llm(args.host, args.port, args.latency, args.latency_jitter, args.quota_rpm, args.error_rate))
+    elif args.command == "batch":
+        asyncio.run(run_batch(args.api, args.transcripts, args.model))
+    else:
+        asyncio.run(run_load(args.api, args.requests, args.concurrency, args.model))
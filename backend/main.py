@@ -1,18 +1,35 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
-import sqlite3
 import json
 from datetime import datetime
+import logging
 import os
+import time
+import asyncio
+import analytics
+import database
+from jobs import JobQueue, TERMINAL_STATUSES
 
 # Import your existing analyzer
 try:
-    from analyzers.analyzer import analyze_transcript
+    from analyzers.analyzer import analyze_transcript, analyze_transcript_async, analyze_transcript_deterministic, analyze_transcript_stream, analyze_batch_async
+    from analyzers.cache import analysis_cache
+    from analyzers.response_parser import parse_metrics
+    from analyzers.router import routing_metrics
+    from config import BATCH_MAX_ITEMS, JOB_WORKERS, JOB_MAX_ATTEMPTS, JOB_BACKOFF_SECONDS, llm_limiter
     from utils.detectors import pre_check_callback, pre_check_interaction, pre_check_time_respect, pre_check_needs, pre_check_transfer
+    from utils.tracing import LoggingTraceSink, set_trace_sink
     print("✅ Successfully imported analyzer functions")
+
+    # Detector traces are off by default; QA_TRACE_DETECTORS=1 logs them as JSON records
+    if os.getenv("QA_TRACE_DETECTORS"):
+        trace_logger = logging.getLogger("qa.detectors")
+        trace_logger.setLevel(logging.DEBUG)
+        trace_logger.addHandler(logging.StreamHandler())
+        set_trace_sink(LoggingTraceSink(trace_logger))
 except ImportError as e:
     print(f"❌ Import error: {e}")
     print("⚠️  Using mock analyzer for demo")
@@ -58,6 +75,25 @@ except ImportError as e:
             }
         }
     
+    async def analyze_transcript_async(transcript, model="gpt-4o"):
+        return analyze_transcript(transcript, model=model)
+    
+    def analyze_transcript_deterministic(transcript):
+        return analyze_transcript(transcript)
+    
+    async def analyze_transcript_stream(transcript, model="gpt-4o"):
+        yield 'result', analyze_transcript(transcript, model=model)
+    
+    async def analyze_batch_async(transcripts, model="gpt-4o", mode="llm"):
+        return [{'result': analyze_transcript(t, model=model), 'elapsed_seconds': 0.0} for t in transcripts]
+    
+    analysis_cache = None
+    parse_metrics = None
+    routing_metrics = None
+    llm_limiter = None
+    BATCH_MAX_ITEMS = 1000
+    JOB_WORKERS, JOB_MAX_ATTEMPTS, JOB_BACKOFF_SECONDS = 4, 3, 2.0
+    
     # Mock detector functions
     def pre_check_callback(transcript):
         return True
@@ -92,32 +128,49 @@ app.add_middleware(
 
 # Database setup
 def init_db():
-    # Create data directory if it doesn't exist
-    os.makedirs('data', exist_ok=True)
-    
-    conn = sqlite3.connect('data/qa_analyses.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS analyses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            transcript_text TEXT,
-            model_used TEXT,
-            overall_score INTEGER,
-            max_score INTEGER,
-            percentage_score REAL,
-            analysis_results TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    database.init_db()
     print("✅ Database initialized successfully")
 
 init_db()
 
+# 'deterministic' scores from the detectors only (no LLM call) for bulk triage
+ANALYSIS_MODES = ("llm", "deterministic")
+
 class AnalysisRequest(BaseModel):
     transcript: str
-    model: str = "gpt-4o"
+    model: str = "auto"  # Tiered routing: gpt-4o-mini first, gpt-4o when it disagrees with the pre-checks
+    mode: str = "llm"
+
+class BatchAnalysisRequest(BaseModel):
+    transcripts: List[str]
+    model: str = "auto"
+    mode: str = "llm"
+
+def check_mode(mode: str) -> None:
+    if mode not in ANALYSIS_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown mode '{mode}', expected one of {', '.join(ANALYSIS_MODES)}")
+
+def analysis_model(request: AnalysisRequest) -> str:
+    """Model an analysis runs (and is stored) under; deterministic mode has its own."""
+    check_mode(request.mode)
+    return "deterministic" if request.mode == "deterministic" else request.model
+
+async def run_job_analysis(transcript: str, model: str) -> dict:
+    if model == "deterministic":
+        return await asyncio.to_thread(analyze_transcript_deterministic, transcript)
+    return await analyze_transcript_async(transcript, model=model)
+
+job_queue = JobQueue(run_job_analysis, database.insert_analysis,
+                     workers=JOB_WORKERS, max_attempts=JOB_MAX_ATTEMPTS, backoff_seconds=JOB_BACKOFF_SECONDS)
+
+@app.on_event("startup")
+async def start_job_queue():
+    await job_queue.start()
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    await job_queue.stop()
+    database.close_all()
 
 @app.get("/")
 async def root():
@@ -127,44 +180,42 @@ async def root():
         "status": "running",
         "endpoints": {
             "analyze": "/api/analyze",
+            "analyze_stream": "/api/analyze/stream",
+            "analyze_batch": "/api/analyze/batch",
+            "jobs": "/api/jobs",
             "analyses": "/api/analyses",
             "dashboard_stats": "/api/dashboard/stats",
+            "kpi_summary": "/api/analytics/kpis",
+            "kpi_trends": "/api/analytics/trends",
+            "pre_check_failures": "/api/analytics/failures",
+            "cache_stats": "/api/cache/stats",
+            "parsing_stats": "/api/parsing/stats",
+            "routing_stats": "/api/routing/stats",
+            "llm_stats": "/api/llm/stats",
             "docs": "/docs"
         }
     }
 
 @app.post("/api/analyze")
 async def analyze_chat(request: AnalysisRequest):
+    model = analysis_model(request)  # Stored under its own model name so analytics keep detector-only scores apart
     try:
         print(f"📨 Received analysis request")
         print(f"   Transcript length: {len(request.transcript)} characters")
-        print(f"   Model: {request.model}")
+        print(f"   Model: {request.model}, mode: {request.mode}")
         
-        # Perform analysis using your existing function
-        result = analyze_transcript(request.transcript, model=request.model)
+        if model == "deterministic":
+            result = await asyncio.to_thread(analyze_transcript_deterministic, request.transcript)
+        else:
+            # Await the analysis so a slow completion doesn't block other requests on this worker
+            result = await analyze_transcript_async(request.transcript, model=model)
         
         print(f"✅ Analysis completed")
         print(f"   Overall score: {result.get('overall_scores', {}).get('total_score', 0)}/{result.get('overall_scores', {}).get('max_possible_score', 45)}")
         print(f"   Percentage: {result.get('overall_scores', {}).get('percentage_score', 0)}%")
         
-        # Store in database
-        conn = sqlite3.connect('data/qa_analyses.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO analyses 
-            (transcript_text, model_used, overall_score, max_score, percentage_score, analysis_results)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
-            request.transcript,
-            request.model,
-            result.get('overall_scores', {}).get('total_score', 0),
-            result.get('overall_scores', {}).get('max_possible_score', 45),
-            result.get('overall_scores', {}).get('percentage_score', 0),
-            json.dumps(result)
-        ))
-        conn.commit()
-        analysis_id = cursor.lastrowid
-        conn.close()
+        # Store in database (off the event loop, on a pooled connection)
+        analysis_id = await asyncio.to_thread(database.insert_analysis, request.transcript, model, result)
         
         print(f"💾 Analysis saved to database with ID: {analysis_id}")
         
@@ -179,93 +230,213 @@ async def analyze_chat(request: AnalysisRequest):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Analysis error: {str(e)}")
 
-@app.get("/api/analyses")
-async def get_analyses(limit: int = 50, offset: int = 0):
-    conn = sqlite3.connect('data/qa_analyses.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT id, transcript_text, model_used, overall_score, max_score, 
-               percentage_score, created_at 
-        FROM analyses 
-        ORDER BY created_at DESC 
-        LIMIT ? OFFSET ?
-    ''', (limit, offset))
+@app.post("/api/analyze/stream")
+async def analyze_chat_stream(request: AnalysisRequest):
+    """Server-Sent Events: 'pre_checks' right away, then 'token' deltas and one 'section' per KPI as the
+    completion streams in, and finally 'result' with the stored analysis_id. Deterministic mode has
+    nothing to stream and sends the 'result' event alone."""
+    model = analysis_model(request)
+    print(f"📨 Received streaming analysis request ({len(request.transcript)} characters, model {model})")
+    
+    async def analysis_events():
+        if model == "deterministic":
+            yield 'result', await asyncio.to_thread(analyze_transcript_deterministic, request.transcript)
+            return
+        async for event, data in analyze_transcript_stream(request.transcript, model=model):
+            yield event, data
+    
+    async def events():
+        async for event, data in analysis_events():
+            if event == 'result':
+                analysis_id = await asyncio.to_thread(database.insert_analysis, request.transcript, model, data)
+                print(f"💾 Streamed analysis saved to database with ID: {analysis_id}")
+                data = {"analysis_id": analysis_id, "result": data, "status": "success"}
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post("/api/analyze/batch")
+async def analyze_batch(request: Request, model: Optional[str] = None, mode: Optional[str] = None):
+    """Analyze many transcripts in one call.
+
+    Accepts a JSON body ({"transcripts": [...], "model": "...", "mode": "..."} or a bare array of transcript
+    strings) or multipart/form-data with one or more `files` and optional `model` and `mode` fields.
+    mode=deterministic skips the LLM; items whose result has triage.borderline are the ones to escalate.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        transcripts = []
+        for upload in form.getlist("files"):
+            try:
+                transcripts.append((await upload.read()).decode("utf-8"))
+            except UnicodeDecodeError as e:
+                raise HTTPException(status_code=400, detail=f"File '{upload.filename}' is not UTF-8 text: {e}")
+        model = model or form.get("model")
+        mode = mode or form.get("mode")
+    else:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be JSON or multipart/form-data")
+        if isinstance(body, list):
+            transcripts = body
+        else:
+            try:
+                batch = BatchAnalysisRequest(**body)
+            except (TypeError, ValueError) as e:
+                raise HTTPException(status_code=400, detail=f"Invalid batch request: {e}")
+            transcripts = batch.transcripts
+            model = model or batch.model
+            mode = mode or batch.mode
+    mode = mode or "llm"
+    check_mode(mode)
+    model = "deterministic" if mode == "deterministic" else model or "auto"
     
-    analyses = []
-    for row in cursor.fetchall():
-        analyses.append({
-            "id": row[0],
-            "transcript_preview": row[1][:100] + "..." if len(row[1]) > 100 else row[1],
-            "model_used": row[2],
-            "overall_score": row[3],
-            "max_score": row[4],
-            "percentage_score": row[5],
-            "created_at": row[6]
+    if not transcripts:
+        raise HTTPException(status_code=400, detail="No transcripts provided")
+    if len(transcripts) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch too large: {len(transcripts)} > {BATCH_MAX_ITEMS}")
+    if not all(isinstance(t, str) for t in transcripts):
+        raise HTTPException(status_code=400, detail="Transcripts must be strings")
+    
+    print(f"📨 Received batch analysis request: {len(transcripts)} transcripts, model {model}, mode {mode}")
+    started = time.perf_counter()
+    outcomes = await analyze_batch_async(transcripts, model=model, mode=mode)
+    analysis_seconds = time.perf_counter() - started
+    
+    analysis_ids = await asyncio.to_thread(
+        database.insert_analyses, [(transcript, model, outcome['result']) for transcript, outcome in zip(transcripts, outcomes)])
+    items = []
+    for index, (analysis_id, outcome) in enumerate(zip(analysis_ids, outcomes)):
+        result = outcome['result']
+        items.append({
+            "index": index,
+            "analysis_id": analysis_id,
+            "status": "error" if 'api_error' in result else "success",
+            "elapsed_seconds": outcome['elapsed_seconds'],
+            "result": result
         })
     
-    conn.close()
-    return {"analyses": analyses}
+    total_seconds = time.perf_counter() - started
+    item_seconds = [item['elapsed_seconds'] for item in items]
+    usages = [item['result']['usage'] for item in items if 'usage' in item['result']]
+    llm_seconds = [item['result']['llm_latency_seconds'] for item in items if 'llm_latency_seconds' in item['result']]
+    prompt_tokens = sum(usage['prompt_tokens'] for usage in usages)
+    cached_tokens = sum(usage['cached_tokens'] for usage in usages)
+    borderline = sum(1 for item in items if item['result'].get('triage', {}).get('borderline'))
+    routes = [item['result']['routing'] for item in items if 'routing' in item['result']]
+    escalated = sum(1 for route in routes if route['escalated'])
+    print(f"✅ Batch completed: {len(items)} analyses in {total_seconds:.2f}s")
+    
+    return {
+        "status": "success",
+        "model": model,
+        "mode": mode,
+        "count": len(items),
+        "failed": sum(1 for item in items if item['status'] == 'error'),
+        "items": items,
+        "timing": {
+            "total_seconds": round(total_seconds, 4),
+            "analysis_seconds": round(analysis_seconds, 4),
+            "avg_item_seconds": round(sum(item_seconds) / len(item_seconds), 4),
+            "max_item_seconds": max(item_seconds),
+            "items_per_second": round(len(items) / total_seconds, 2) if total_seconds else None,
+            "avg_llm_seconds": round(sum(llm_seconds) / len(llm_seconds), 4) if llm_seconds else None
+        },
+        "usage": {
+            "completions": len(usages),
+            "cache_hits": sum(1 for item in items if item['result'].get('cache_hit')),
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "cached_ratio": round(cached_tokens / prompt_tokens, 4) if prompt_tokens else None,
+            "completion_tokens": sum(usage['completion_tokens'] for usage in usages)
+        },
+        "triage": {
+            "borderline": borderline,
+            "escalation_rate": round(borderline / len(items), 4)
+        } if mode == "deterministic" else None,
+        "routing": {
+            "routed": len(routes),
+            "escalated": escalated,
+            "escalation_rate": round(escalated / len(routes), 4),
+            "avg_route_seconds": round(sum(route['latency_seconds'] for route in routes) / len(routes), 4),
+            "cost_usd": round(sum(route['cost_usd'] or 0.0 for route in routes), 6)
+        } if routes else None
+    }
+
+@app.post("/api/jobs", status_code=202)
+async def submit_job(request: AnalysisRequest):
+    """Queue an analysis and return immediately; poll /api/jobs/{id} or stream /api/jobs/{id}/events."""
+    job = await job_queue.submit(request.transcript, analysis_model(request))
+    print(f"📥 Queued analysis job {job['id']}")
+    return job
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """Server-Sent Events: one 'status' event per state change, ending with the terminal state."""
+    if not await job_queue.get(job_id, include_result=False):
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def events():
+        last_seen = None
+        while True:
+            job = await job_queue.get(job_id, include_result=False)
+            snapshot = (job['status'], job['attempts'])
+            if snapshot != last_seen:
+                last_seen = snapshot
+                if job['status'] in TERMINAL_STATUSES:
+                    job = await job_queue.get(job_id)
+                yield f"event: status\ndata: {json.dumps(job)}\n\n"
+            if job['status'] in TERMINAL_STATUSES:
+                return
+            await asyncio.sleep(0.5)
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/api/analyses")
+async def get_analyses(limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0), before_id: Optional[int] = None,
+                       after_created_at: Optional[str] = None, model: Optional[str] = None):
+    """Newest first. Page with before_id=<next_before_id of the previous page> rather than offset."""
+    analyses = await asyncio.to_thread(database.list_analyses, limit, offset, before_id, after_created_at, model)
+    return {
+        "analyses": analyses,
+        "next_before_id": analyses[-1]["id"] if len(analyses) == limit else None
+    }
 
 @app.get("/api/analyses/{analysis_id}")
-async def get_analysis_detail(analysis_id: int):
-    conn = sqlite3.connect('data/qa_analyses.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT analysis_results FROM analyses WHERE id = ?', (analysis_id,))
-    row = cursor.fetchone()
-    conn.close()
+async def get_analysis_detail(analysis_id: int, include_artifacts: bool = False):
+    """Scored result; sent_prompt/raw_response/masked_transcript only with include_artifacts=true."""
+    result = await asyncio.to_thread(database.get_analysis_results, analysis_id, include_artifacts)
     
-    if not row:
+    if result is None:
         raise HTTPException(status_code=404, detail="Analysis not found")
     
-    return json.loads(row[0])
+    return result
+
+@app.get("/api/analyses/{analysis_id}/artifacts/{name}")
+async def get_analysis_artifact(analysis_id: int, name: str):
+    """Lazily load one stored artifact: transcript, sent_prompt, raw_response or masked_transcript."""
+    if name not in (database.TRANSCRIPT_ARTIFACT, *database.ARTIFACT_FIELDS):
+        raise HTTPException(status_code=404, detail="Unknown artifact")
+    content = await asyncio.to_thread(database.get_artifact, analysis_id, name)
+    if content is None:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    return {"analysis_id": analysis_id, "name": name, "content": content}
 
 @app.get("/api/dashboard/stats")
 async def get_dashboard_stats():
-    conn = sqlite3.connect('data/qa_analyses.db')
-    cursor = conn.cursor()
-    
     try:
-        # Total analyses
-        cursor.execute('SELECT COUNT(*) FROM analyses')
-        total_analyses = cursor.fetchone()[0] or 0
-        
-        # Average score
-        cursor.execute('SELECT AVG(percentage_score) FROM analyses')
-        avg_score_result = cursor.fetchone()[0]
-        avg_score = float(avg_score_result) if avg_score_result else 0.0
-        
-        # Recent analyses (last 7 days)
-        cursor.execute('''
-            SELECT COUNT(*) FROM analyses 
-            WHERE created_at >= datetime('now', '-7 days')
-        ''')
-        recent_analyses = cursor.fetchone()[0] or 0
-        
-        # Score distribution
-        cursor.execute('''
-            SELECT 
-                SUM(CASE WHEN percentage_score >= 80 THEN 1 ELSE 0 END) as excellent,
-                SUM(CASE WHEN percentage_score >= 60 AND percentage_score < 80 THEN 1 ELSE 0 END) as good,
-                SUM(CASE WHEN percentage_score >= 40 AND percentage_score < 60 THEN 1 ELSE 0 END) as average,
-                SUM(CASE WHEN percentage_score < 40 THEN 1 ELSE 0 END) as poor
-            FROM analyses
-        ''')
-        dist = cursor.fetchone()
-        score_distribution = {
-            "excellent": dist[0] or 0,
-            "good": dist[1] or 0,
-            "average": dist[2] or 0,
-            "poor": dist[3] or 0
-        }
-        
-        print(f"📊 Dashboard stats: {total_analyses} total analyses, avg score: {avg_score}%")
-        
-        return {
-            "total_analyses": total_analyses,
-            "average_score": round(avg_score, 2),
-            "recent_analyses": recent_analyses,
-            "score_distribution": score_distribution
-        }
+        stats = await asyncio.to_thread(database.dashboard_stats)
+        print(f"📊 Dashboard stats: {stats['total_analyses']} total analyses, avg score: {stats['average_score']}%")
+        return stats
         
     except Exception as e:
         print(f"❌ Error getting dashboard stats: {e}")
@@ -281,8 +452,54 @@ async def get_dashboard_stats():
                 "poor": 0
             }
         }
-    finally:
-        conn.close()
+
+@app.get("/api/analytics/kpis")
+async def get_kpi_summary(since: Optional[str] = None, model: Optional[str] = None):
+    """Per-KPI score averages and pre-check pass rates from the analysis_kpis table."""
+    return {"kpis": await asyncio.to_thread(database.kpi_summary, since, model)}
+
+MAX_ANALYTICS_DAYS = 3660  # Ten years of daily aggregates
+
+@app.get("/api/analytics/trends")
+async def get_kpi_trends(granularity: str = "day", days: int = Query(90, ge=1, le=MAX_ANALYTICS_DAYS),
+                         model: Optional[str] = None, kpi: Optional[str] = None):
+    """Average score per KPI per day or week, one series per model."""
+    if granularity not in analytics.GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {', '.join(analytics.GRANULARITIES)}")
+    return await asyncio.to_thread(analytics.kpi_trends, granularity, days, model, kpi)
+
+@app.get("/api/analytics/failures")
+async def get_pre_check_failures(days: int = Query(30, ge=1, le=MAX_ANALYTICS_DAYS), model: Optional[str] = None,
+                                 limit: int = Query(10, ge=1, le=100)):
+    """KPI pre-checks ranked by failure count over the last `days` days."""
+    return await asyncio.to_thread(analytics.pre_check_failures, days, model, limit)
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    if analysis_cache is None:
+        return {"enabled": False}
+    return analysis_cache.stats()
+
+@app.get("/api/parsing/stats")
+async def get_parsing_stats():
+    """How LLM responses parsed since startup; failures fell back to pre-check scoring."""
+    if parse_metrics is None:
+        return {"enabled": False}
+    return parse_metrics.stats()
+
+@app.get("/api/routing/stats")
+async def get_routing_stats():
+    """Tiered routing (model=auto) since startup: escalation rate and latency and cost per tier."""
+    if routing_metrics is None:
+        return {"enabled": False}
+    return routing_metrics.stats()
+
+@app.get("/api/llm/stats")
+async def get_llm_stats():
+    """Rate limiter since startup: throttling, 429s and retries, and the circuit breaker state."""
+    if llm_limiter is None:
+        return {"enabled": False}
+    return llm_limiter.stats()
 
 # Health check endpoint
 @app.get("/health")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Throughput and scaling check for the PII masker.
+
+    python masker_benchmark.py                  # realistic throughput vs the legacy masker + scaling check
+    python masker_benchmark.py --size 200000    # base length of the adversarial inputs
+
+Realistic throughput is measured on a repeated support transcript. Each adversarial input (long
+digit, uppercase, whitespace and e-mail-like runs) is masked at --size and 4x --size characters;
+a linear masker takes about 4x as long, a backtracking one far more. Exits 1 when any input grows
+faster than --max-ratio.
+"""
+import argparse
+import re
+import sys
+import time
+
+from utils.masker import mask_sensitive_data
+
+SAMPLE_TRANSCRIPT = """( 0 s ): System: Chat started
+( 45 s ): A: Hello, thank you for contacting support. May I have a callback number in case we get disconnected?
+( 1 m 10 s ): Tech Bob: CBR 5551234567, or (555) 123-4567 if that one is busy
+( 1 m 40 s ): A: Could you please provide the account number or telephone number, and the name and address associated with the account?
+( 2 m 5 s ): Tech Bob: Account # 12345678, JOHN SMITH, 123 MAIN ST, john.smith@example.com
+( 3 m 0 s ): A: Thanks, what is the reason for contact today?
+( 3 m 30 s ): Tech Bob: Customer has no dial tone since 2 days ago
+( 6 m 0 s ): A: I reset the port, the problem is fixed. Do you need any voice services provisioned?
+( 6 m 30 s ): Tech Bob: No, all set"""
+
+ADVERSARIAL_UNITS = ["1 ", "1", "1-", "1 a ", "A", "AB ", "AB\t", "a", "a.", "a@"]
+
+def legacy_mask(transcript: str) -> str:
+    """The four-pass masker this module replaced, kept for comparison."""
+    transcript = re.sub(r'\b\d{10}\b', '[PHONE]', transcript)
+    transcript = re.sub(r'\b[A-Z]{2,}\s+[A-Z]{2,}(\s+[A-Z]{2,})?\b', '[NAME]', transcript)
+    transcript = re.sub(r'\d+\s+[A-Z0-9\s]+(?:ST|AVE|RD|BLVD|DR|LN|CT|PL|WAY|CIR|STREET|AVENUE|ROAD|BOULEVARD|DRIVE|LANE|COURT|PLACE|WAY|CIRCLE)\b', '[ADDRESS]', transcript, flags=re.I)
+    transcript = re.sub(r'\b(?! \s*[m s]\b)\d{8,}\b', '[ACCOUNT]', transcript)
+    return transcript
+
+def seconds(mask, text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        mask(text)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=200, help="transcript repetitions for the throughput run")
+    parser.add_argument("--size", type=int, default=100000, help="base length of the adversarial inputs")
+    parser.add_argument("--max-ratio", type=float, default=8.0, help="allowed time growth for 4x the input")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    text = "\n".join([SAMPLE_TRANSCRIPT] * args.copies)
+    megabytes = len(text.encode("utf-8")) / 1e6
+    print("=" * 60)
+    print(f"{'masker':<12}{'MB/s':>12}")
+    for name, mask in (("current", mask_sensitive_data), ("legacy", legacy_mask)):
+        print(f"{name:<12}{megabytes / seconds(mask, text, args.repeat):>12.2f}")
+
+    print("=" * 60)
+    print(f"{'input':<12}{'chars':>10}{'seconds':>12}{'4x seconds':>14}{'ratio':>10}")
+    failed = []
+    for unit in ADVERSARIAL_UNITS:
+        count = max(1, args.size // len(unit))
+        small = seconds(mask_sensitive_data, unit * count, args.repeat)
+        large = seconds(mask_sensitive_data, unit * count * 4, args.repeat)
+        ratio = large / max(small, 1e-6)
+        print(f"{unit!r:<12}{len(unit) * count:>10}{small:>12.4f}{large:>14.4f}{ratio:>10.1f}")
+        if ratio > args.max_ratio:
+            failed.append(unit)
+    print("=" * 60)
+    if failed:
+        print(f"❌ Superlinear masking time for: {', '.join(repr(unit) for unit in failed)}")
+        sys.exit(1)
+    print("✅ Masking time grows linearly on every adversarial input")
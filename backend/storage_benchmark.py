@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Write/read throughput and on-disk size of the analyses store for each storage codec.
+
+    python storage_benchmark.py --rows 5000
+    python storage_benchmark.py --source data/qa_analyses.db   # recycle real transcripts
+
+Each codec gets a fresh database. The first --warmup rows are written, the dictionaries are trained
+on them (as `python database.py train-dictionaries` would in production), then --rows analyses are
+inserted in batches and read back with their artifacts.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import codec
+import database
+
+SAMPLE_TRANSCRIPT = """( 0 s ): System: Chat started
+( 45 s ): A: Hello, thank you for contacting support. May I have a callback number in case we get disconnected?
+( 1 m 10 s ): Tech Bob: CBR 5551234567
+( 1 m 40 s ): A: Could you please provide the account number or telephone number, and the name and address associated with the account?
+( 2 m 5 s ): Tech Bob: Account # 12345678, JOHN SMITH, 123 MAIN ST
+( 3 m 0 s ): A: Thanks, what is the reason for contact today?
+( 3 m 30 s ): Tech Bob: Customer has no dial tone
+( 6 m 0 s ): A: I reset the port, the problem is fixed. Do you need any voice services provisioned?
+( 6 m 30 s ): Tech Bob: No, all set"""
+
+SECTION_RESULT = {"score": 5, "max_score": 5, "reasoning": "The agent met the criterion for this section."}
+KPI_SECTIONS = ["first_response_analysis", "security_verification_analysis", "customer_needs_analysis",
+                "interaction_analysis", "time_respect_analysis", "needs_identification_analysis", "transfer_analysis"]
+
+NAMES = ["JOHN SMITH", "MARIA GARCIA", "WEI CHEN", "AISHA KHAN", "OLIVIA BROWN", "DAVID MILLER"]
+ISSUES = ["Customer has no dial tone", "Internet drops every evening", "Static on the line",
+          "Cannot receive calls", "Slow speeds since Monday", "Voicemail not working"]
+
+def synthetic_transcript(rng: random.Random) -> str:
+    text = SAMPLE_TRANSCRIPT.replace("JOHN SMITH", rng.choice(NAMES))
+    text = text.replace("5551234567", str(rng.randint(2000000000, 9999999999)))
+    text = text.replace("12345678", str(rng.randint(10000000, 99999999)))
+    text = text.replace("Customer has no dial tone", rng.choice(ISSUES))
+    return "\n".join([text] * rng.randint(1, 4))
+
+def source_transcripts(path: str) -> list:
+    """Transcripts of an existing database (read from a migrated copy; the original is untouched)."""
+    directory = tempfile.mkdtemp(prefix="qa-source-")
+    database.DB_PATH = os.path.join(directory, "source.db")
+    shutil.copy(path, database.DB_PATH)
+    try:
+        database.init_db()
+        ids = [row[0] for row in database.get_connection().execute("SELECT id FROM analyses")]
+        transcripts = [database.get_artifact(analysis_id, database.TRANSCRIPT_ARTIFACT) for analysis_id in ids]
+    finally:
+        database.close_all()
+        shutil.rmtree(directory, ignore_errors=True)
+    return [transcript for transcript in transcripts if transcript]
+
+def make_row(transcript: str, rng: random.Random) -> tuple:
+    result = {section: dict(SECTION_RESULT, score=rng.randint(0, 5)) for section in KPI_SECTIONS}
+    result["overall_scores"] = {"total_score": 30, "max_possible_score": 45, "percentage_score": round(rng.random() * 100, 1)}
+    result["raw_response"] = json.dumps({section: result[section] for section in KPI_SECTIONS}, indent=2)
+    result["masked_transcript"] = transcript
+    result["sent_prompt"] = "Evaluate this chat transcript against the QA rubric.\n\n" + transcript
+    return transcript, "gpt-4o", result
+
+def database_size(directory: str) -> int:
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+def run_codec(name: str, rows: list, warmup: int, batch: int) -> dict:
+    directory = tempfile.mkdtemp(prefix=f"qa-{name}-")
+    database.DB_PATH = os.path.join(directory, "qa_analyses.db")
+    database.STORAGE_CODEC = name
+    try:
+        database.init_db()
+        database.insert_analyses(rows[:warmup])
+        database.train_dictionaries(recompress=True)
+        measured = rows[warmup:]
+
+        started = time.perf_counter()
+        ids = []
+        for offset in range(0, len(measured), batch):
+            ids += database.insert_analyses(measured[offset:offset + batch])
+        write_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for analysis_id in ids:
+            database.get_analysis_results(analysis_id, include_artifacts=True)
+            database.get_artifact(analysis_id, database.TRANSCRIPT_ARTIFACT)
+        read_seconds = time.perf_counter() - started
+
+        database.get_connection().execute("VACUUM")
+        database.get_connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")  # VACUUM goes through the WAL too
+        return {
+            "codec": name,
+            "writes_per_second": len(ids) / write_seconds,
+            "reads_per_second": len(ids) / read_seconds,
+            "bytes_per_row": database_size(directory) / len(rows)
+        }
+    finally:
+        database.close_all()
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--warmup", type=int, default=500, help="rows written before training dictionaries")
+    parser.add_argument("--batch", type=int, default=50, help="analyses per insert transaction")
+    parser.add_argument("--source", help="existing qa_analyses.db whose transcripts are recycled")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = source_transcripts(args.source) if args.source else []
+    rows = [make_row(rng.choice(corpus) if corpus else synthetic_transcript(rng), rng)
+            for _ in range(args.warmup + args.rows)]
+
+    codecs = ["none", "zlib"] + (["zstd"] if codec.zstandard is not None else [])
+    results = [run_codec(name, rows, args.warmup, args.batch) for name in codecs]
+    baseline = results[0]["bytes_per_row"]
+
+    print("=" * 66)
+    print(f"{'codec':<8}{'writes/s':>12}{'reads/s':>12}{'bytes/row':>14}{'vs none':>12}")
+    for result in results:
+        print(f"{result['codec']:<8}{result['writes_per_second']:>12.0f}{result['reads_per_second']:>12.0f}"
+              f"{result['bytes_per_row']:>14.0f}{result['bytes_per_row'] / baseline:>11.0%}")
+    print("=" * 66)
+    if codec.zstandard is None:
+        print("ℹ️  zstandard is not installed; zstd was skipped")
@@ -0,0 +1,80 @@
+import time
+
+import pytest
+
+from masker_benchmark import ADVERSARIAL_UNITS
+from utils.masker import StreamingUnmasker, TokenMasker, luhn_valid, unmask
+
+# Well above what a linear masker needs for ADVERSARIAL_CHARS; a backtracking one takes minutes
+ADVERSARIAL_CHARS = 200000
+ADVERSARIAL_SECONDS = 2.0
+
+def masked(text):
+    masker = TokenMasker()
+    return masker.mask(text), masker.token_map
+
+def test_email():
+    text, token_map = masked("reach me at john.smith+qa@mail.example.com today")
+    assert text == "reach me at [EMAIL_1] today"
+    assert token_map == {'[EMAIL_1]': 'john.smith+qa@mail.example.com'}
+
+def test_ssn():
+    text, token_map = masked("SSN 123-45-6789.")
+    assert text == "SSN [SSN_1]."
+    assert token_map == {'[SSN_1]': '123-45-6789'}
+
+@pytest.mark.parametrize("card", ["4111111111111111", "4111 1111 1111 1111", "4111-1111-1111-1111"])
+def test_luhn_valid_card(card):
+    assert luhn_valid(card.replace(' ', '').replace('-', ''))
+    text, token_map = masked(f"card {card} on file")
+    assert text == "card [CARD_1] on file"
+    assert token_map == {'[CARD_1]': card}
+
+def test_non_luhn_digit_group_falls_back_to_phone_and_account():
+    assert not luhn_valid("555123456712345678")
+    text, token_map = masked("CBR 5551234567 12345678")
+    assert text == "CBR [PHONE_1] [ACCOUNT_1]"
+    assert token_map == {'[PHONE_1]': '5551234567', '[ACCOUNT_1]': '12345678'}
+
+@pytest.mark.parametrize("phone", ["5551234567", "555-123-4567", "555.123.4567", "(555) 123-4567", "(555)123-4567"])
+def test_formatted_phone(phone):
+    text, token_map = masked(f"call {phone} back")
+    assert text == "call [PHONE_1] back"
+    assert token_map == {'[PHONE_1]': phone}
+
+def test_same_value_same_placeholder():
+    text, token_map = masked("JOHN SMITH at 5551234567, again 5551234567 for JOHN SMITH")
+    assert text == "[NAME_1] at [PHONE_1], again [PHONE_1] for [NAME_1]"
+    assert len(token_map) == 2
+
+SAMPLE = ("( 1 m 10 s ): Tech Bob: CBR 5551234567, or (555) 123-4567 if busy\n"
+          "( 2 m 5 s ): Tech Bob: Account # 12345678, JOHN SMITH, 123 MAIN ST, john.smith@example.com, "
+          "SSN 123-45-6789, card 4111 1111 1111 1111")
+
+def test_unmask_round_trip():
+    text, token_map = masked(SAMPLE)
+    assert set(token_map) == {'[PHONE_1]', '[PHONE_2]', '[ACCOUNT_1]', '[NAME_1]', '[ADDRESS_1]', '[EMAIL_1]', '[SSN_1]', '[CARD_1]'}
+    assert not any(value in text for value in token_map.values())
+    assert unmask(text, token_map) == SAMPLE
+
+def test_unmask_leaves_unknown_placeholders():
+    assert unmask("[PHONE_9] and [OTHER_1]", {'[PHONE_1]': '5551234567'}) == "[PHONE_9] and [OTHER_1]"
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 8, 13])
+def test_streaming_unmasker_matches_unmask(chunk_size):
+    text, token_map = masked(SAMPLE)
+    unmasker = StreamingUnmasker(token_map)
+    streamed = ''.join(unmasker.feed(text[start:start + chunk_size]) for start in range(0, len(text), chunk_size))
+    assert streamed + unmasker.flush() == SAMPLE
+
+def test_streaming_unmasker_flushes_incomplete_placeholder():
+    unmasker = StreamingUnmasker({'[PHONE_1]': '5551234567'})
+    assert unmasker.feed("call [PHO") == "call "
+    assert unmasker.flush() == "[PHO"
+
+@pytest.mark.parametrize("unit", ADVERSARIAL_UNITS)
+def test_adversarial_input_masks_in_linear_time(unit):
+    text = unit * (ADVERSARIAL_CHARS // len(unit))
+    started = time.perf_counter()
+    TokenMasker().mask(text)
+    assert time.perf_counter() - started < ADVERSARIAL_SECONDS
@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+from analyzers.response_parser import KPI_SECTIONS, parse_analysis_response
+
+def response(**sections):
+    body = {section: {'score': 5, 'reasoning': 'ok'} for section in KPI_SECTIONS}
+    body.update(sections)
+    return f"```json\n{json.dumps(body)}\n```"
+
+def test_all_sections_parsed():
+    parsed, outcome = parse_analysis_response(response())
+    assert outcome == 'parsed'
+    assert all(parsed[section]['score'] == 5 for section in KPI_SECTIONS)
+
+@pytest.mark.parametrize("score, expected", [(2.5, 2), (4.9, 4), ("3", 3), (" 2.5 ", 2), (None, 0)])
+def test_fractional_and_string_scores_are_kept(score, expected):
+    parsed, outcome = parse_analysis_response(response(interaction_analysis={'score': score, 'reasoning': 'half points'}))
+    assert outcome == 'parsed'
+    assert parsed['interaction_analysis'] == {'score': expected, 'reasoning': 'half points'}
+    assert parsed['transfer_analysis']['score'] == 5
+
+@pytest.mark.parametrize("bad", [{'score': 'high'}, {'score': [5]}, {'score': float('inf')}, "not a section"])
+def test_bad_section_only_drops_that_section(bad):
+    parsed, outcome = parse_analysis_response(response(transfer_analysis=bad))
+    assert outcome == 'parsed'
+    assert 'transfer_analysis' not in parsed
+    assert all(parsed[section]['score'] == 5 for section in KPI_SECTIONS if section != 'transfer_analysis')
+
+def test_all_sections_bad_fails_validation():
+    bad = {section: {'score': 'n/a'} for section in KPI_SECTIONS}
+    assert parse_analysis_response(json.dumps(bad)) == (None, 'validation_failed')
+
+def test_section_extras_and_unknown_keys_are_kept():
+    parsed, _ = parse_analysis_response(response(first_response_analysis={'score': 5, 'reasoning': 'ok', 'within_2_minutes': 'true'}, note='x'))
+    assert parsed['first_response_analysis']['within_2_minutes'] == 'true'
+    assert parsed['note'] == 'x'
+
+@pytest.mark.parametrize("text, outcome", [("no json here", 'no_json'), ('{"first_response_analysis": {"score": 5', 'invalid_json'), ("[1, 2]", 'no_json')])
+def test_unusable_responses(text, outcome):
+    assert parse_analysis_response(text) == (None, outcome)
@@ -0,0 +1,78 @@
+import re
+from typing import Dict, FrozenSet, List, Tuple
+
+# Detector rule registry: (rule name, pattern, case_sensitive). Patterns are written in lowercase and
+# run against the pre-lowered message, which keeps sre's literal-prefix fast scan (re.I disables it);
+# case-sensitive rules run against the original message instead.
+DETECTOR_RULES: List[Tuple[str, str, bool]] = [
+    # Interaction
+    ('tone_polite', r'\bthanks?\b|\bplease\b|\bappreciate\b|\bhelp\b|\bassist\b', False),
+    ('tone_negative', r'\bstupid\b|\bidiot\b|\brude\b|\bannoying\b|\bwhatever\b|\bnot my problem\b', False),
+    ('sets_expectation', r'\b(step|action|will take|process)\b.*(minute|time|soon|moment|while)\b', False),
+    ('accepts_responsibility', r'\bsorry\b|\bapologize\b|\binconvenience\b|\bwe will fix\b|\bour mistake\b|\bresponsibility\b', False),
+    ('responsibility_context', r'\bmistake\b|\berror\b|\bwrong\b|\bfault\b|\bissue\b.*company|\bproblem\b.*your', False),
+    # Reason identification
+    ('reason_ask', r'reason for (contact|call|chat)|issue|problem|what can i help|how can i assist', False),
+    ('specific_issue', r'no dial tone|bad pin|no mss record|don\'t have ip|no ip|ip issue', False),
+    ('resolution', r'problem (fixed|resolved|solved)|issue (fixed|resolved|solved)|working (now|fine)|'
+                   r'resolved the (problem|issue)|fixed the (problem|issue)|completed.*successfully|'
+                   r'good to go|all set|completed.*fix|resolved|fixed', False),
+    # Transfer
+    ('voice_services_ask', r'\bdo you need any voice services provisioned\b|\bvoice services.*provisioned\b|\bprovision.*voice services\b', False),
+    # Verification
+    ('ask_account', r'account number|account #', False),
+    ('ask_phone', r'telephone number|phone number', False),
+    ('ask_name', r'name.*account', False),
+    ('ask_address', r'service address|address.*account|address|street', False),
+    ('provided_account', r'account #|sid|case #|\b\d{8,}\b', False),
+    ('provided_phone', r'telephone|phone\s+\d|\b\d{10}\b', False),
+    ('provided_name', r'\b[A-Z]{2,}\s+[A-Z]{2,}(\s+[A-Z]{2,})?\b', True),
+    ('provided_address', r'address|street|city|state|zip', False),
+    ('confirm_yes', r'^\s*yes\s*$', False),
+    ('confirm_context', r'name|address|street|city|farmers|mutual|assn|st', False),
+    # Callback (ask phrases kept separate so traces can name the phrase that matched)
+    ('callback_contact_disconnected', r'contact number.*disconnected', False),
+    ('callback_number_disconnected', r'callback number.*disconnected', False),
+    ('callback_lose_connection', r'phone number.*lose connection', False),
+    ('callback_disconnected', r'disconnected\?', False),
+    ('callback_cbr', r'cbr', False),
+    ('callback_call_back', r'call back.*number', False),
+    ('callback_variant', r'callback.*(number|phone)', False),
+    ('callback_provided', r'(cbr|callback|phone|contact|number)\s*(\:|\b)?\s*(\d{10}|\[phone\])', False),
+    # Needs
+    ('info_provided', r'account|phone|name|address', False),
+    ('info_request', r'provide|what is|can you give', False),
+]
+
+CALLBACK_ASK_RULES = (
+    'callback_contact_disconnected',
+    'callback_number_disconnected',
+    'callback_lose_connection',
+    'callback_disconnected',
+    'callback_cbr',
+    'callback_call_back',
+    'callback_variant',
+)
+
+class RuleEngine:
+    """Compile every registered rule once and scan a message into the set of rule names that match."""
+
+    def __init__(self, rules: List[Tuple[str, str, bool]]):
+        self.patterns: Dict[str, re.Pattern] = {name: re.compile(pattern) for name, pattern, _ in rules}
+        self._lowered_rules = [(name, self.patterns[name].search) for name, _, cased in rules if not cased]
+        self._cased_rules = [(name, self.patterns[name].search) for name, _, cased in rules if cased]
+
+    def scan(self, message: str, lowered: str = None) -> FrozenSet[str]:
+        if lowered is None:
+            lowered = message.lower()
+        hits = [name for name, search in self._lowered_rules if search(lowered)]
+        hits.extend(name for name, search in self._cased_rules if search(message))
+        return frozenset(hits)
+
+DETECTOR_ENGINE = RuleEngine(DETECTOR_RULES)
+
+def turn_hits(turn) -> FrozenSet[str]:
+    """Rule hits for a parsed turn, scanned on first use and cached on the turn."""
+    if turn.hits is None:
+        turn.hits = DETECTOR_ENGINE.scan(turn.message, turn.lowered)
+    return turn.hits
@@ -0,0 +1,56 @@
+import json
+import logging
+from typing import Any, Dict
+
+class TraceSink:
+    """Receives detector trace events. Sinks with enabled=False are never handed a formatted message."""
+    enabled = False
+
+    def emit(self, event: str, message: str, fields: Dict[str, Any]) -> None:
+        pass
+
+class NullTraceSink(TraceSink):
+    """Default sink: drops everything (used by the API backend)."""
+    enabled = False
+
+class StreamlitTraceSink(TraceSink):
+    """Writes trace messages into the Streamlit page, as the detectors used to do directly."""
+    enabled = True
+
+    def __init__(self):
+        import streamlit as st  # Only the Streamlit app pays for this import
+        self._write = st.write
+
+    def emit(self, event: str, message: str, fields: Dict[str, Any]) -> None:
+        self._write(message)
+
+class LoggingTraceSink(TraceSink):
+    """Emits one JSON record per trace event on a standard logger; silent while the level is filtered out."""
+
+    def __init__(self, logger: logging.Logger = None, level: int = logging.DEBUG):
+        self.logger = logger or logging.getLogger('qa.detectors')
+        self.level = level
+
+    @property
+    def enabled(self) -> bool:
+        return self.logger.isEnabledFor(self.level)
+
+    def emit(self, event: str, message: str, fields: Dict[str, Any]) -> None:
+        record = {'event': event, 'message': message}
+        record.update({key: value for key, value in fields.items() if key != 'message'})
+        self.logger.log(self.level, json.dumps(record, default=str))
+
+_sink: TraceSink = NullTraceSink()
+
+def set_trace_sink(sink: TraceSink) -> None:
+    global _sink
+    _sink = sink if sink is not None else NullTraceSink()
+
+def get_trace_sink() -> TraceSink:
+    return _sink
+
+def trace(event: str, template: str, **fields: Any) -> None:
+    """Emit a trace event; `template` is only formatted (str.format with fields) when a sink is listening."""
+    sink = _sink
+    if sink.enabled:
+        sink.emit(event, template.format(**fields), fields)
@@ -19,19 +19,56 @@ import {
   Card,
   CardContent,
   LinearProgress,
+  Chip,
 } from '@mui/material';
 import { ExpandMore, Upload, PlayArrow } from '@mui/icons-material';
 import { analysisAPI } from '../services/api';
 import { KPIMetrics } from '../components/KPIMetrics';
 import { ScoreBreakdownChart } from '../components/ScoreBreakdownChart';
-import { AnalysisResult } from '../types';
+import { AnalysisResult, AnalysisStreamEvent, PreCheckData } from '../types';
+
+const SECTIONS = [
+  { key: 'first_response_analysis', title: 'First Response Analysis' },
+  { key: 'security_verification_analysis', title: 'Security Verification Analysis' },
+  { key: 'customer_needs_analysis', title: 'Customer Expectations and Needs Analysis' },
+  { key: 'interaction_analysis', title: 'Customer Interaction and Accepting Responsibility' },
+  { key: 'time_respect_analysis', title: 'Respectful of Customer\'s Time' },
+  { key: 'needs_identification_analysis', title: 'Identify Contact\'s Needs and Avoid Redundant Asks' },
+  { key: 'transfer_analysis', title: 'Voice Services Question Analysis' },
+];
 
 export const AnalyzeChat: React.FC = () => {
   const [transcript, setTranscript] = useState('');
-  const [model, setModel] = useState('gpt-4o');
+  const [model, setModel] = useState('auto');
   const [result, setResult] = useState<AnalysisResult | null>(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
+  // Partial results shown while the analysis streams in
+  const [preChecks, setPreChecks] = useState<PreCheckData | null>(null);
+  const [liveSections, setLiveSections] = useState<Record<string, any>>({});
+  const [liveText, setLiveText] = useState('');
+
+  const handleStreamEvent = (event: AnalysisStreamEvent) => {
+    switch (event.event) {
+      case 'pre_checks':
+        setPreChecks(event.data);
+        break;
+      case 'token':
+        setLiveText((text) => text + event.data);
+        break;
+      case 'section':
+        setLiveSections((sections) => ({ ...sections, [event.data.key]: event.data.section }));
+        break;
+      case 'escalated':
+        // The next model tier starts over; its sections replace the previous tier's
+        setLiveSections({});
+        setLiveText('');
+        break;
+      case 'result':
+        setResult(event.data.result);
+        break;
+    }
+  };
 
   const handleAnalyze = async () => {
     if (!transcript.trim()) {
@@ -42,13 +79,12 @@ export const AnalyzeChat: React.FC = () => {
     setLoading(true);
     setError('');
     setResult(null); // Reset previous results
+    setPreChecks(null);
+    setLiveSections({});
+    setLiveText('');
     
     try {
-      const response = await analysisAPI.analyzeTranscript({
-        transcript,
-        model,
-      });
-      setResult(response.result);
+      await analysisAPI.analyzeTranscriptStream({ transcript, model }, handleStreamEvent);
     } catch (err: any) {
       setError(err.message || 'Analysis failed. Please try again.');
     } finally {
@@ -137,6 +173,7 @@ export const AnalyzeChat: React.FC = () => {
                     label="AI Model"
                     onChange={(e) => setModel(e.target.value)}
                   >
+                    <MenuItem value="auto">Auto (GPT-4o Mini, escalates)</MenuItem>
                     <MenuItem value="gpt-4o">GPT-4o</MenuItem>
                     <MenuItem value="gpt-4o-mini">GPT-4o Mini</MenuItem>
                   </Select>
@@ -162,6 +199,40 @@ export const AnalyzeChat: React.FC = () => {
           </Paper>
         </Grid>
 
+        {loading && preChecks && (
+          <Grid item xs={12}>
+            <Paper sx={{ p: 3 }}>
+              <Typography variant="h6" gutterBottom sx={{ fontWeight: 600 }}>
+                Live Analysis
+              </Typography>
+              <Box display="flex" flexWrap="wrap" gap={1} mb={2}>
+                <Chip label={`Response time: ${preChecks.pre_calculated?.response_time_seconds ?? 'n/a'}s`} />
+                <Chip label={`Within 2 minutes: ${preChecks.pre_calculated?.within_2_minutes ? 'yes' : 'no'}`} />
+                <Chip label={`Verification asks: ${preChecks.pre_verification?.num_asked ?? 0}/3`} />
+                <Chip label={`Issue resolved: ${preChecks.pre_reason?.issue_resolved ? 'yes' : 'no'}`} />
+                <Chip label={`Voice services asked: ${preChecks.pre_transfer?.asked_voice ? 'yes' : 'no'}`} />
+              </Box>
+              {SECTIONS.filter(({ key }) => liveSections[key]).map(({ key, title }) => (
+                <Box key={key} mb={1}>
+                  <Typography variant="subtitle2" sx={{ fontWeight: 600 }}>
+                    {title}: {liveSections[key].score}
+                  </Typography>
+                  <Typography variant="body2" color="textSecondary">
+                    {liveSections[key].reasoning}
+                  </Typography>
+                </Box>
+              ))}
+              {liveText && (
+                <Box mt={2} p={2} sx={{ backgroundColor: '#f5f5f5', borderRadius: 1, maxHeight: 200, overflow: 'auto' }}>
+                  <Typography variant="body2" component="pre" sx={{ fontFamily: 'monospace', whiteSpace: 'pre-wrap', m: 0 }}>
+                    {liveText}
+                  </Typography>
+                </Box>
+              )}
+            </Paper>
+          </Grid>
+        )}
+
         {result && (
           <Grid item xs={12}>
             <Paper sx={{ p: 3 }}>
@@ -214,15 +285,7 @@ export const AnalyzeChat: React.FC = () => {
                 Detailed Analysis
               </Typography>
               
-              {[
-                { key: 'first_response_analysis', title: 'First Response Analysis' },
-                { key: 'security_verification_analysis', title: 'Security Verification Analysis' },
-                { key: 'customer_needs_analysis', title: 'Customer Expectations and Needs Analysis' },
-                { key: 'interaction_analysis', title: 'Customer Interaction and Accepting Responsibility' },
-                { key: 'time_respect_analysis', title: 'Respectful of Customer\'s Time' },
-                { key: 'needs_identification_analysis', title: 'Identify Contact\'s Needs and Avoid Redundant Asks' },
-                { key: 'transfer_analysis', title: 'Voice Services Question Analysis' },
-              ].map(({ key, title }) => {
+              {SECTIONS.map(({ key, title }) => {
                 const analysis = getAnalysisData(key);
                 return (
                   <Accordion key={key} sx={{ mb: 1 }}>
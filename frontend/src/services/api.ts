@@ -1,4 +1,4 @@
-import { AnalysisResult, AnalysisRequest, DashboardStats, AnalysisSummary } from '../types';
+import { AnalysisMode, AnalysisResult, AnalysisRequest, AnalysisStreamEvent, AnalysisJob, BatchAnalysisResponse, DashboardStats, AnalysisArtifactName, AnalysisCursor, AnalysisPage, KpiSummary, KpiTrends, PreCheckFailures } from '../types';
 
 const API_BASE = 'http://localhost:8000';
 
@@ -36,8 +36,80 @@ export const analysisAPI = {
     return data;
   },
 
-  getAnalyses: async (limit: number = 50, offset: number = 0): Promise<{ analyses: AnalysisSummary[] }> => {
-    const response = await fetch(`${API_BASE}/api/analyses?limit=${limit}&offset=${offset}`);
+  // POST body, so EventSource can't be used; the SSE frames are parsed off the fetch stream instead
+  analyzeTranscriptStream: async (
+    request: AnalysisRequest,
+    onEvent: (event: AnalysisStreamEvent) => void,
+  ): Promise<{ analysis_id: number; result: AnalysisResult }> => {
+    const response = await fetch(`${API_BASE}/api/analyze/stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(request),
+    });
+    if (!response.ok || !response.body) {
+      const errorText = await response.text();
+      throw new APIError(`API error (${response.status}): ${errorText}`, response.status);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let final: { analysis_id: number; result: AnalysisResult } | null = null;
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const frame = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        let name = 'message';
+        const data: string[] = [];
+        frame.split('\n').forEach((line) => {
+          if (line.startsWith('event: ')) name = line.slice(7);
+          else if (line.startsWith('data: ')) data.push(line.slice(6));
+        });
+        const event = { event: name, data: JSON.parse(data.join('\n')) } as AnalysisStreamEvent;
+        if (event.event === 'result') final = event.data;
+        onEvent(event);
+      }
+    }
+
+    if (!final) {
+      throw new APIError('Analysis stream ended without a result');
+    }
+    return final;
+  },
+
+  analyzeBatch: async (transcripts: string[], model: string, mode: AnalysisMode = 'llm'): Promise<BatchAnalysisResponse> => {
+    const response = await fetch(`${API_BASE}/api/analyze/batch`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ transcripts, model, mode }),
+    });
+    return handleResponse(response);
+  },
+
+  submitJob: async (request: AnalysisRequest): Promise<AnalysisJob> => {
+    const response = await fetch(`${API_BASE}/api/jobs`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(request),
+    });
+    return handleResponse(response);
+  },
+
+  getJob: async (jobId: string): Promise<AnalysisJob> => {
+    const response = await fetch(`${API_BASE}/api/jobs/${jobId}`);
+    return handleResponse(response);
+  },
+
+  getAnalyses: async (limit: number = 50, cursor: AnalysisCursor = {}): Promise<AnalysisPage> => {
+    const params = new URLSearchParams({ limit: String(limit) });
+    if (cursor.beforeId !== undefined) params.set('before_id', String(cursor.beforeId));
+    if (cursor.afterCreatedAt !== undefined) params.set('after_created_at', cursor.afterCreatedAt);
+    if (cursor.model !== undefined) params.set('model', cursor.model);
+    const response = await fetch(`${API_BASE}/api/analyses?${params}`);
     return handleResponse(response);
   },
 
@@ -46,6 +118,36 @@ export const analysisAPI = {
     return handleResponse(response);
   },
 
+  getAnalysisArtifact: async (analysisId: number, name: AnalysisArtifactName): Promise<string> => {
+    const response = await fetch(`${API_BASE}/api/analyses/${analysisId}/artifacts/${name}`);
+    const data = await handleResponse(response);
+    return data.content;
+  },
+
+  getKpiSummary: async (filters: { since?: string; model?: string } = {}): Promise<{ kpis: KpiSummary[] }> => {
+    const params = new URLSearchParams();
+    if (filters.since !== undefined) params.set('since', filters.since);
+    if (filters.model !== undefined) params.set('model', filters.model);
+    const response = await fetch(`${API_BASE}/api/analytics/kpis?${params}`);
+    return handleResponse(response);
+  },
+
+  getKpiTrends: async (filters: { granularity?: 'day' | 'week'; days?: number; model?: string; kpi?: string } = {}): Promise<KpiTrends> => {
+    const params = new URLSearchParams();
+    Object.entries(filters).forEach(([key, value]) => {
+      if (value !== undefined) params.set(key, String(value));
+    });
+    const response = await fetch(`${API_BASE}/api/analytics/trends?${params}`);
+    return handleResponse(response);
+  },
+
+  getPreCheckFailures: async (days: number = 30, model?: string): Promise<PreCheckFailures> => {
+    const params = new URLSearchParams({ days: String(days) });
+    if (model !== undefined) params.set('model', model);
+    const response = await fetch(`${API_BASE}/api/analytics/failures?${params}`);
+    return handleResponse(response);
+  },
+
   getDashboardStats: async (): Promise<DashboardStats> => {
     const response = await fetch(`${API_BASE}/api/dashboard/stats`);
     return handleResponse(response);
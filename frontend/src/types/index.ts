@@ -15,9 +15,68 @@ export interface AnalysisResult {
 }
 
 
+export type AnalysisMode = 'llm' | 'deterministic';
+
 export interface AnalysisRequest {
   transcript: string;
   model: string;
+  mode?: AnalysisMode;
+}
+
+export interface PreCheckData {
+  pre_calculated: any;
+  pre_verification: any;
+  pre_reason: any;
+  pre_interaction: any;
+  pre_time_respect: any;
+  pre_needs: any;
+  pre_transfer: any;
+}
+
+export type AnalysisStreamEvent =
+  | { event: 'pre_checks'; data: PreCheckData }
+  | { event: 'token'; data: string }
+  | { event: 'section'; data: { key: string; section: any } }
+  | { event: 'escalated'; data: { from: string; to: string; reasons: string[] } }
+  | { event: 'result'; data: { analysis_id: number; result: AnalysisResult; status: string } };
+
+export interface BatchAnalysisItem {
+  index: number;
+  analysis_id: number;
+  status: 'success' | 'error';
+  elapsed_seconds: number;
+  result: AnalysisResult;
+}
+
+export interface BatchAnalysisResponse {
+  status: string;
+  model: string;
+  mode: AnalysisMode;
+  count: number;
+  failed: number;
+  items: BatchAnalysisItem[];
+  timing: {
+    total_seconds: number;
+    analysis_seconds: number;
+    avg_item_seconds: number;
+    max_item_seconds: number;
+    items_per_second: number | null;
+  };
+  triage: { borderline: number; escalation_rate: number } | null;
+}
+
+export interface AnalysisJob {
+  id: string;
+  status: 'queued' | 'running' | 'succeeded' | 'failed';
+  model: string;
+  attempts: number;
+  max_attempts: number;
+  analysis_id: number | null;
+  error: string | null;
+  created_at: number;
+  started_at: number | null;
+  finished_at: number | null;
+  result?: AnalysisResult | null;
 }
 
 export interface DashboardStats {
@@ -42,5 +101,50 @@ export interface AnalysisSummary {
   created_at: string;
 }
 
+export interface AnalysisPage {
+  analyses: AnalysisSummary[];
+  next_before_id: number | null;
+}
 
+export interface AnalysisCursor {
+  beforeId?: number;
+  afterCreatedAt?: string;
+  model?: string;
+}
+
+export type AnalysisArtifactName = 'transcript' | 'sent_prompt' | 'raw_response' | 'masked_transcript';
 
+export interface KpiSummary {
+  kpi: string;
+  analyses: number;
+  average_score: number;
+  max_score: number;
+  average_percentage: number;
+  pre_check_pass_rate: number | null;
+  fallback_rate: number;
+}
+
+export interface KpiTrendPoint {
+  bucket: string;
+  model: string;
+  kpi: string;
+  analyses: number;
+  average_score: number;
+  average_percentage: number;
+}
+
+export interface KpiTrends {
+  granularity: 'day' | 'week';
+  since: string;
+  points: KpiTrendPoint[];
+}
+
+export interface PreCheckFailures {
+  since: string;
+  failures: {
+    kpi: string;
+    checked: number;
+    failed: number;
+    failure_rate: number | null;
+  }[];
+}
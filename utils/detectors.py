@@ -1,71 +1,93 @@
-import re
-from typing import Dict, Any, Optional
-import streamlit as st
-from utils.parsers import parse_timestamp  # Import from sibling module
+import functools
+from typing import Callable, Dict, Any, Optional, TypeVar, Union
+from utils.tracing import trace
+from utils.parsers import ParsedTranscript, parse_transcript  # Import from sibling module
+from utils.rules import CALLBACK_ASK_RULES, DETECTOR_ENGINE, turn_hits
 
-def pre_check_interaction(transcript: str) -> Dict[str, Any]:
+# Bump whenever detector logic or rules change; part of the analysis cache key
+DETECTOR_VERSION = "1"
+
+# Detectors accept raw text or a ParsedTranscript; pass the parsed form to avoid re-tokenizing
+TranscriptInput = Union[str, ParsedTranscript]
+
+DetectorResult = TypeVar('DetectorResult')
+
+def memoized_detector(detector: Callable[[ParsedTranscript], DetectorResult]) -> Callable[[TranscriptInput], DetectorResult]:
+    """Run a detector at most once per ParsedTranscript.
+
+    Prompt building, fallback scoring and the pre_* payload all ask for the same detectors; with the
+    analysis' parse passed around they share one result. Raw text gets a fresh parse (and memo) per call.
+    """
+    name = detector.__name__
+
+    @functools.wraps(detector)
+    def wrapper(transcript: TranscriptInput) -> DetectorResult:
+        parsed = parse_transcript(transcript)
+        parsed.detector_calls[name] += 1
+        if name not in parsed.detector_memo:
+            parsed.detector_runs[name] += 1
+            parsed.detector_memo[name] = detector(parsed)
+        return parsed.detector_memo[name]
+    return wrapper
+
+@memoized_detector
+def pre_check_interaction(transcript: TranscriptInput) -> Dict[str, Any]:
     """Detect appropriate tone, communication, and context-dependent responsibility acceptance."""
-    time_data = calculate_response_time(transcript)
-    agent_id = time_data['first_agent_identifier'].lower() if time_data['first_agent_identifier'] else ''
-    lines = [line.strip() for line in transcript.split('\n') if line.strip()]
+    parsed = parse_transcript(transcript)
+    agent_id = parsed.agent_id
     proper_language = True  # Assume true, flag if slang/profanity
     appropriate_tone = True  # Assume appropriate tone
     accepts_responsibility = False
     responsibility_context_present = False  # Flag if responsibility context exists in conversation
     sets_expectation = False
-    
-    st.write(f"Scanning for interaction quality...")
-    
-    for line in lines:
-        match = re.match(r'\(\s*[^)]+\s*\):\s*([^:]+?):\s*(.*)', line)
-        if not match:
-            continue
-        
-        speaker, message = match.groups()
-        speaker_lower = speaker.strip().rstrip(':').lower()
-        msg_lower = message.lower()
-        
-        is_agent = speaker_lower == agent_id
-        
+
+    trace('interaction.scan', "Scanning for interaction quality...")
+
+    for turn in parsed.turns:
+        message = turn.message
+        hits = turn_hits(turn)
+
+        is_agent = turn.speaker_lower == agent_id
+
         if is_agent:
             # Check for appropriate tone and communication
-            if re.search(r'\bthanks?\b|\bplease\b|\bappreciate\b|\bhelp\b|\bassist\b', msg_lower, re.I):
+            if 'tone_polite' in hits:
                 appropriate_tone = True
-                st.write(f"Appropriate tone detected: '{message[:50]}...'")
-            
+                trace('interaction.tone', "Appropriate tone detected: '{message:.50}...'", message=message)
+
             # Check for negative/inappropriate language
-            if re.search(r'\bstupid\b|\bidiot\b|\brude\b|\bannoying\b|\bwhatever\b|\bnot my problem\b', msg_lower, re.I):
+            if 'tone_negative' in hits:
                 appropriate_tone = False
                 proper_language = False
-                st.write(f"Inappropriate language detected: '{message[:50]}...'")
-            
+                trace('interaction.inappropriate', "Inappropriate language detected: '{message:.50}...'", message=message)
+
             # Check for expectation setting
-            if re.search(r'\b(step|action|will take|process)\b.*(minute|time|soon|moment|while)\b', msg_lower, re.I):
+            if 'sets_expectation' in hits:
                 sets_expectation = True
-                st.write(f"Expectation setting detected: '{message[:50]}...'")
-            
+                trace('interaction.expectation', "Expectation setting detected: '{message:.50}...'", message=message)
+
             # Check for responsibility acceptance (only when context exists)
-            if re.search(r'\bsorry\b|\bapologize\b|\binconvenience\b|\bwe will fix\b|\bour mistake\b|\bresponsibility\b', msg_lower, re.I):
+            if 'accepts_responsibility' in hits:
                 accepts_responsibility = True
-                st.write(f"Responsibility acceptance detected: '{message[:50]}...'")
-        
+                trace('interaction.responsibility', "Responsibility acceptance detected: '{message:.50}...'", message=message)
+
         # Check if responsibility context exists in the conversation (from customer or agent)
-        if re.search(r'\bmistake\b|\berror\b|\bwrong\b|\bfault\b|\bissue\b.*company|\bproblem\b.*your', msg_lower, re.I):
+        if 'responsibility_context' in hits:
             responsibility_context_present = True
-            st.write(f"Responsibility context detected: '{message[:50]}...'")
-    
+            trace('interaction.responsibility_context', "Responsibility context detected: '{message:.50}...'", message=message)
+
     # Determine if all requirements are met
     # Core requirements: proper language and appropriate tone (MUST)
     core_requirements_met = proper_language and appropriate_tone
-    
+
     # Responsibility is only required if context exists
     responsibility_required = responsibility_context_present
     responsibility_met = not responsibility_required or (responsibility_required and accepts_responsibility)
-    
+
     # All met if core requirements + responsibility (if applicable) + expectation setting
     # But expectation setting is NOT mandatory - it's a nice-to-have but not required
     all_met = core_requirements_met and responsibility_met
-    
+
     return {
         'proper_language': proper_language,
         'appropriate_tone': appropriate_tone,
@@ -78,62 +100,39 @@ def pre_check_interaction(transcript: str) -> Dict[str, Any]:
         'reasoning': f"Language: {proper_language}; Tone: {appropriate_tone}; Responsibility context: {responsibility_context_present}; Responsibility accepted: {accepts_responsibility}; Expectation: {sets_expectation}"
     }
 
-def pre_check_reason_identification(transcript: str) -> Dict[str, Any]:
+@memoized_detector
+def pre_check_reason_identification(transcript: TranscriptInput) -> Dict[str, Any]:
     """Detect if agent identifies reason for contact and issue gets resolved."""
-    time_data = calculate_response_time(transcript)
-    agent_id = time_data['first_agent_identifier'].lower() if time_data['first_agent_identifier'] else ''
-    lines = [line.strip() for line in transcript.split('\n') if line.strip()]
+    parsed = parse_transcript(transcript)
     identified_reason = False
     issue_resolved = False
     detected_issue = None
     resolution_indicators = []
-    
-    st.write(f"Scanning for reason identification and resolution...")
-    
-    for line in lines:
-        match = re.match(r'\(\s*[^)]+\s*\):\s*([^:]+?):\s*(.*)', line)
-        if not match:
-            continue
-        
-        speaker, message = match.groups()
-        speaker_clean = speaker.strip().rstrip(':')
-        speaker_lower = speaker_clean.lower()
-        msg_lower = message.lower()
-        
-        is_agent = (speaker_lower == agent_id) or (len(re.sub(r'[^a-zA-Z]', '', speaker_clean)) == 1 and not re.search(r'system', speaker_lower, re.I))
-        
+
+    trace('reason.scan', "Scanning for reason identification and resolution...")
+
+    for turn in parsed.turns:
+        message = turn.message
+        hits = turn_hits(turn)
+
+        is_agent = turn.role == 'agent'
+
         # Detect identification of reason
         if is_agent:
-            if re.search(r'reason for (contact|call|chat)|issue|problem|what can i help|how can i assist', msg_lower):
+            if 'reason_ask' in hits:
                 identified_reason = True
-                st.write(f"Reason identification detected: '{message[:50]}...'")
-        
+                trace('reason.identified', "Reason identification detected: '{message:.50}...'", message=message)
+
         # Detect specific issues
-        if re.search(r'no dial tone|bad pin|no mss record|don\'t have IP|no ip|ip issue', msg_lower, re.I):
+        if 'specific_issue' in hits:
             detected_issue = message
-            st.write(f"Specific issue detected: {detected_issue}")
-        
+            trace('reason.issue', "Specific issue detected: {message}", message=detected_issue)
+
         # Detect resolution indicators (from agent or technician)
-        resolution_patterns = [
-            r'problem (fixed|resolved|solved)',
-            r'issue (fixed|resolved|solved)',
-            r'working (now|fine)',
-            r'resolved the (problem|issue)',
-            r'fixed the (problem|issue)',
-            r'completed.*successfully',
-            r'good to go',
-            r'all set',
-            r'completed.*fix',
-            r'resolved',
-            r'fixed'
-        ]
-        
-        for pattern in resolution_patterns:
-            if re.search(pattern, msg_lower, re.I):
-                resolution_indicators.append(message)
-                issue_resolved = True
-                st.write(f"Resolution indicator detected: '{message[:50]}...'")
-                break
+        if 'resolution' in hits:
+            resolution_indicators.append(message)
+            issue_resolved = True
+            trace('reason.resolution', "Resolution indicator detected: '{message:.50}...'", message=message)
 
     # If reason is identified AND issue gets resolved in the chat, that's sufficient
     requirement_met = identified_reason and issue_resolved
@@ -148,43 +147,35 @@ def pre_check_reason_identification(transcript: str) -> Dict[str, Any]:
     }
 
 
-def pre_check_transfer(transcript: str) -> Dict[str, Any]:
+@memoized_detector
+def pre_check_transfer(transcript: TranscriptInput) -> Dict[str, Any]:
     """Detect if agent asks voice services provisioned question."""
-    time_data = calculate_response_time(transcript)
-    agent_id = time_data['first_agent_identifier'].lower() if time_data['first_agent_identifier'] else ''
-    lines = [line.strip() for line in transcript.split('\n') if line.strip()]
+    parsed = parse_transcript(transcript)
+    agent_id = parsed.agent_id
     asked_voice = False
-    
-    for line in lines:
-        match = re.match(r'\(\s*[^)]+\s*\):\s*([^:]+?):\s*(.*)', line)
-        if not match:
-            continue
-        
-        speaker, message = match.groups()
-        speaker_lower = speaker.strip().rstrip(':').lower()
-        msg_lower = message.lower()
-        
-        is_agent = speaker_lower == agent_id
-        
+
+    for turn in parsed.turns:
+        message = turn.message
+
+        is_agent = turn.speaker_lower == agent_id
+
         if is_agent:
             # Check for voice services question
-            if re.search(r'\bdo you need any voice services provisioned\b', msg_lower, re.I) or \
-               re.search(r'\bvoice services.*provisioned\b', msg_lower, re.I) or \
-               re.search(r'\bprovision.*voice services\b', msg_lower, re.I):
+            if 'voice_services_ask' in turn_hits(turn):
                 asked_voice = True
-                st.write(f"Asked voice services: '{message[:50]}...'")
+                trace('transfer.voice_services', "Asked voice services: '{message:.50}...'", message=message)
                 break  # Stop after first occurrence
-    
+
     return {
         'asked_voice': asked_voice,
         'reasoning': f"Asked voice services: {asked_voice}"
     }
 
-def pre_check_verification(transcript: str) -> Dict[str, Any]:
+@memoized_detector
+def pre_check_verification(transcript: TranscriptInput) -> Dict[str, Any]:
     """Enhanced: Detect customer provision (phone digits, confirmation 'Yes'). Check combos and if tech pre-supplied."""
-    time_data = calculate_response_time(transcript)
-    agent_id = time_data['first_agent_identifier'].lower() if time_data['first_agent_identifier'] else ''
-    lines = [line.strip() for line in transcript.split('\n') if line.strip()]
+    parsed = parse_transcript(transcript)
+    agent_id = parsed.agent_id
     asked_account = False
     asked_phone = False
     asked_name = False
@@ -196,76 +187,64 @@ def pre_check_verification(transcript: str) -> Dict[str, Any]:
         'address': False
     }
     tech_pre_supplied = False  # Flag if customer/tech provided info before agent ask
-    
-    st.write(f"Found {len(lines)} lines in transcript")
-    st.write(f"Detected agent ID: '{agent_id}'")
-    
-    previous_line = None
-    previous_msg_lower = None
-    previous_was_agent = False
-    
-    for line in lines:
-        match = re.match(r'\(\s*[^)]+\s*\):\s*([^:]+?):\s*(.*)', line)
-        if not match:
-            continue
-        
-        speaker, message = match.groups()
-        speaker_clean = speaker.strip().rstrip(':')
-        speaker_lower = speaker_clean.lower()
-        speaker_len = len(re.sub(r'[^a-zA-Z]', '', speaker_clean))
-        msg_lower = message.lower()
-        
-        is_agent = (speaker_lower == agent_id) or (speaker_len == 1 and not re.search(r'system', speaker_lower, re.I))
-        if is_agent:
-            if re.search(r'account number|account #', msg_lower):
+
+    trace('verification.lines', "Found {line_count} lines in transcript", line_count=parsed.line_count)
+    trace('verification.agent', "Detected agent ID: '{agent_id}'", agent_id=agent_id)
+
+    previous_turn = None
+
+    for turn in parsed.turns:
+        message = turn.message
+        hits = turn_hits(turn)
+
+        if turn.role == 'agent':
+            if 'ask_account' in hits:
                 asked_account = True
-                st.write(f"Agent ask account: '{message[:50]}...'")
-            if re.search(r'telephone number|phone number', msg_lower):
+                trace('verification.ask_account', "Agent ask account: '{message:.50}...'", message=message)
+            if 'ask_phone' in hits:
                 asked_phone = True
-                st.write(f"Agent ask phone: '{message[:50]}...'")
-            if re.search(r'name.*account', msg_lower):
+                trace('verification.ask_phone', "Agent ask phone: '{message:.50}...'", message=message)
+            if 'ask_name' in hits:
                 asked_name = True
-                st.write(f"Agent ask name: '{message[:50]}...'")
-            if re.search(r'service address|address.*account|address|street', msg_lower):
+                trace('verification.ask_name', "Agent ask name: '{message:.50}...'", message=message)
+            if 'ask_address' in hits:
                 asked_address = True
-                st.write(f"Agent ask address: '{message[:50]}...'")
-        
-        elif not re.search(r'system', speaker_lower, re.I) and speaker_len > 1:
-            st.write(f"Customer line: '{speaker}' - Msg starts: '{message[:50]}...'")
+                trace('verification.ask_address', "Agent ask address: '{message:.50}...'", message=message)
+
+        elif turn.role == 'customer':
+            trace('verification.customer_line', "Customer line: '{speaker}' - Msg starts: '{message:.50}...'", speaker=turn.speaker, message=message)
             # Check for pre-supply in customer messages
-            if re.search(r'account #|sid|case #|\b\d{8,}\b', msg_lower):  # Account patterns
+            if 'provided_account' in hits:  # Account patterns
                 customer_provided['account'] = True
                 tech_pre_supplied = True
-                st.write("-> Set account: True (pre-supplied)")
-            if re.search(r'telephone|phone\s+\d|\b\d{10}\b', msg_lower):
+                trace('verification.provided_account', "-> Set account: True (pre-supplied)")
+            if 'provided_phone' in hits:
                 customer_provided['phone'] = True
                 tech_pre_supplied = True
-                st.write("-> Set phone: True (pre-supplied)")
-            if re.search(r'\b[A-Z]{2,}\s+[A-Z]{2,}(\s+[A-Z]{2,})?\b', message):
+                trace('verification.provided_phone', "-> Set phone: True (pre-supplied)")
+            if 'provided_name' in hits:
                 customer_provided['name'] = True
                 tech_pre_supplied = True
-                st.write("-> Set name: True (pre-supplied)")
-            if re.search(r'address|street|city|state|zip', msg_lower):
+                trace('verification.provided_name', "-> Set name: True (pre-supplied)")
+            if 'provided_address' in hits:
                 customer_provided['address'] = True
                 tech_pre_supplied = True
-                st.write("-> Set address: True (pre-supplied)")
-            if previous_line and re.search(r'^\s*yes\s*$', msg_lower, re.I) and previous_was_agent and re.search(r'name|address|street|city|farmers|mutual|assn|st', previous_msg_lower, re.I):
+                trace('verification.provided_address', "-> Set address: True (pre-supplied)")
+            if previous_turn and 'confirm_yes' in hits and previous_turn.role == 'agent' and 'confirm_context' in turn_hits(previous_turn):
                 customer_provided['name'] = True
                 customer_provided['address'] = True
-                st.write("-> Set name/address: True (confirmation 'Yes')")
-        
-        previous_line = line
-        previous_msg_lower = msg_lower
-        previous_was_agent = is_agent
-    
+                trace('verification.confirmed', "-> Set name/address: True (confirmation 'Yes')")
+
+        previous_turn = turn
+
     # New: Determine asked/provided based on combos
     num_asked = sum([asked_name, asked_address, (asked_phone or asked_account)])
     combo1_obtained = customer_provided['name'] and customer_provided['address'] and customer_provided['phone']
     combo2_obtained = customer_provided['name'] and customer_provided['address'] and customer_provided['account']
     all_provided = combo1_obtained or combo2_obtained  # True if combo obtained (asked or pre-provided)
-    
-    st.write(f"Final provided flags: {customer_provided}")
-    
+
+    trace('verification.provided', "Final provided flags: {provided}", provided=customer_provided)
+
     return {
         'asked_name': asked_name,
         'asked_address': asked_address,
@@ -277,56 +256,38 @@ def pre_check_verification(transcript: str) -> Dict[str, Any]:
         'reasoning': f"Asked {num_asked}/3 (with combo); Obtained all: {all_provided}; Pre-supplied: {tech_pre_supplied}"
     }
 
-def pre_check_callback(transcript: str) -> bool:
+@memoized_detector
+def pre_check_callback(transcript: TranscriptInput) -> bool:
     """Scan ALL agent messages for callback request phrases, including abbreviations like 'cbr'. Also detect if provided by customer if not asked."""
-    time_data = calculate_response_time(transcript)
-    agent_id = time_data['first_agent_identifier'].lower() if time_data['first_agent_identifier'] else ''
-    if not agent_id:
+    parsed = parse_transcript(transcript)
+    if not parsed.agent_id:
         return False
-    
-    lines = [line.strip() for line in transcript.split('\n') if line.strip()]
-    phrases = [
-        r"contact number.*disconnected",
-        r"callback number.*disconnected",
-        r"phone number.*lose connection",
-        r"disconnected\?",
-        r"cbr",  # Detect 'cbr' as callback abbreviation
-        r"call back.*number",  # Handle 'call back' expansion
-        r"callback.*(number|phone)"  # Flexible for 'callback' variants
-    ]
-    
+
     asked = False
     provided = False
-    
-    for line in lines:
-        match = re.match(r'\(\s*[^)]+\s*\):\s*([^:]+?):\s*(.*)', line)
-        if not match:
-            continue
-        
-        speaker, message = match.groups()
-        speaker_clean = speaker.strip().rstrip(':')
-        speaker_lower = speaker_clean.lower()
-        msg_lower = message.lower()
-        
-        is_agent = (speaker_lower == agent_id) or (len(re.sub(r'[^a-zA-Z]', '', speaker_clean)) == 1 and not re.search(r'system', speaker_lower, re.I))
-        
-        if is_agent:
-            for phrase in phrases:
-                if re.search(phrase, msg_lower, re.I):
+
+    for turn in parsed.turns:
+        message = turn.message
+        hits = turn_hits(turn)
+
+        if turn.role == 'agent':
+            for rule in CALLBACK_ASK_RULES:
+                if rule in hits:
                     asked = True
-                    st.write(f"Callback asked in agent message: '{message[:50]}...' (matched phrase: {phrase})")
+                    trace('callback.asked', "Callback asked in agent message: '{message:.50}...' (matched phrase: {phrase})", message=message, phrase=DETECTOR_ENGINE.patterns[rule].pattern)
                     return True
         else:  # Customer line
-            if re.search(r'(cbr|callback|phone|contact|number)\s*(\:|\b)?\s*(\d{10}|\[PHONE\])', msg_lower, re.I):  # Refined: Detect 'CBR:' + number or masked
+            if 'callback_provided' in hits:  # Refined: Detect 'CBR:' + number or masked
                 provided = True
-                st.write(f"Callback provided by customer: '{message[:50]}...'")
-    
+                trace('callback.provided', "Callback provided by customer: '{message:.50}...'", message=message)
+
     return asked or provided
 
 
-def pre_check_time_respect(transcript: str) -> Dict[str, Any]:
+@memoized_detector
+def pre_check_time_respect(transcript: TranscriptInput) -> Dict[str, Any]:
     """Check check-ins and idle time using timestamps."""
-    lines = [line.strip() for line in transcript.split('\n') if line.strip()]
+    parsed = parse_transcript(transcript)
     timestamps = []
     is_chat = True  # Assume chat; detect call if voice keywords
     check_in_interval = 5 * 60 if is_chat else 3 * 60  # seconds
@@ -334,22 +295,19 @@ def pre_check_time_respect(transcript: str) -> Dict[str, Any]:
     last_time = 0
     check_ins_met = True
     no_idle = True
-    
-    for line in lines:
-        match = re.match(r'\(\s*([^)]+)\s*\):\s*([^:]+?):\s*(.*)', line)
-        if match:
-            timestamp_str = match.group(1)
-            seconds = parse_timestamp(timestamp_str)
-            if seconds is not None:
-                timestamps.append(seconds)
-                if seconds - last_time > idle_max:
-                    no_idle = False
-                last_time = seconds
-    
+
+    for turn in parsed.turns:
+        seconds = turn.seconds
+        if seconds is not None:
+            timestamps.append(seconds)
+            if seconds - last_time > idle_max:
+                no_idle = False
+            last_time = seconds
+
     for i in range(1, len(timestamps)):
         if timestamps[i] - timestamps[i-1] > check_in_interval:
             check_ins_met = False
-    
+
     all_met = check_ins_met and no_idle
     return {
         'check_ins_met': check_ins_met,
@@ -358,86 +316,46 @@ def pre_check_time_respect(transcript: str) -> Dict[str, Any]:
         'reasoning': f"Check-ins: {check_ins_met}; No idle: {no_idle}"
     }
 
-def pre_check_needs(transcript: str) -> Dict[str, Any]:
+@memoized_detector
+def pre_check_needs(transcript: TranscriptInput) -> Dict[str, Any]:
     """Check no redundant asks, efficient flow."""
-    time_data = calculate_response_time(transcript)
-    agent_id = time_data['first_agent_identifier'].lower()
-    lines = [line.strip() for line in transcript.split('\n') if line.strip()]
+    parsed = parse_transcript(transcript)
+    agent_id = parsed.agent_id
     provided_info = set()
     redundant_ask = False
-    
-    for line in lines:
-        match = re.match(r'\(\s*[^)]+\s*\):\s*([^:]+?):\s*(.*)', line)
-        if match:
-            speaker, message = match.groups()
-            speaker_lower = speaker.strip().rstrip(':').lower()
-            msg_lower = message.lower()
-            
-            is_agent = speaker_lower == agent_id
-            
-            if not is_agent:
-                if re.search(r'account|phone|name|address', msg_lower):
-                    provided_info.add('info')
-            else:
-                if 'info' in provided_info and re.search(r'provide|what is|can you give', msg_lower):
-                    redundant_ask = True
-    
+
+    for turn in parsed.turns:
+        hits = turn_hits(turn)
+
+        is_agent = turn.speaker_lower == agent_id
+
+        if not is_agent:
+            if 'info_provided' in hits:
+                provided_info.add('info')
+        else:
+            if 'info' in provided_info and 'info_request' in hits:
+                redundant_ask = True
+
     all_met = not redundant_ask
     return {
         'no_redundant_ask': all_met,
         'reasoning': f"No redundant: {all_met}"
     }
 
-def calculate_response_time(transcript: str) -> Dict[str, Any]:
+@memoized_detector
+def calculate_response_time(transcript: TranscriptInput) -> Dict[str, Any]:
     """Prioritize single-character speakers for agent ID, avoid skipping legitimate asks."""
-    lines = [line.strip() for line in transcript.split('\n') if line.strip()]
-    
-    system_time = None
-    first_agent_time = None
-    first_agent_identifier = None
-    first_agent_message = None
-    
-    for line in lines:
-        match = re.match(r'\(\s*([^)]+)\s*\):\s*([^:]+?):\s*(.*)', line)
-        if not match:
-            continue
-        
-        timestamp_str, speaker, message = match.groups()
-        seconds = parse_timestamp(timestamp_str)
-        if seconds is None:
-            continue
-        
-        speaker_clean = speaker.strip().rstrip(':')
-        speaker_lower = speaker_clean.lower()
-        speaker_len = len(re.sub(r'[^a-zA-Z]', '', speaker_clean))
-        message_lower = message.lower()
-        
-        if system_time is None and 'system' in speaker_lower:
-            system_time = seconds
-            continue
-        
-        is_excluded = re.search(r'(customer|user|client|system)', speaker_lower, re.I)
-        is_long_speaker = speaker_len > 1
-        is_provision_like = (re.search(r'(customer phone|address:|name on|sid number|case #)', message_lower) or 
-                             (re.search(r'\b[A-Z]{2,}\s+[A-Z]{2,}\b', message) and 
-                              not re.search(r'thank you|hello|provide|the customer', message_lower, re.I)))
-        
-        if (system_time is not None and first_agent_time is None and
-            not is_excluded and not is_long_speaker and not is_provision_like):
-            
-            first_agent_time = seconds
-            first_agent_identifier = speaker_clean
-            first_agent_message = message
-            st.write(f"Identified agent: '{speaker_clean}' (len={speaker_len}, msg='{message[:30]}...')")
-            break
-    
-    response_time = first_agent_time - system_time if system_time is not None and first_agent_time is not None else None
-    
+    parsed = parse_transcript(transcript)
+    response_time = parsed.response_time_seconds
+
+    if parsed.first_agent_identifier is not None:
+        trace('response_time.agent', "Identified agent: '{agent}' (msg='{message:.30}...')", agent=parsed.first_agent_identifier, message=parsed.first_agent_message)
+
     return {
-        'system_time_seconds': system_time,
-        'first_agent_time_seconds': first_agent_time,
+        'system_time_seconds': parsed.system_time,
+        'first_agent_time_seconds': parsed.first_agent_time,
         'response_time_seconds': response_time,
         'within_2_minutes': response_time is not None and response_time <= 120,
-        'first_agent_identifier': first_agent_identifier,
-        'first_agent_message': first_agent_message
-    }
\ No newline at end of file
+        'first_agent_identifier': parsed.first_agent_identifier,
+        'first_agent_message': parsed.first_agent_message
+    }
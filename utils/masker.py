@@ -1,14 +1,115 @@
 import re
+from collections import Counter
+from typing import Dict, Tuple
+
+STREET_SUFFIXES = ('ST', 'STREET', 'AVE', 'AVENUE', 'RD', 'ROAD', 'BLVD', 'BOULEVARD', 'DR', 'DRIVE',
+                   'LN', 'LANE', 'CT', 'COURT', 'PL', 'PLACE', 'WAY', 'CIR', 'CIRCLE')
+
+# Entity patterns in priority order: where several match at the same position the first one wins.
+# All of them start at a word boundary (factored out below, so most positions are rejected by one
+# check) and bound how far they look ahead, so each start costs O(1) and masking stays linear in
+# the transcript length: no backtracking blow-ups on long uppercase, digit or whitespace runs.
+ENTITY_PATTERNS: Tuple[Tuple[str, str], ...] = (
+    ('EMAIL', r"[\w.+-]{1,64}@[A-Za-z0-9-]{1,63}(?:\.[A-Za-z0-9-]{1,63}){1,8}\b"),
+    ('SSN', r'\d{3}-\d{2}-\d{4}\b'),
+    # House number, one to four words on the same line, then a whole-word street suffix
+    ('ADDRESS', r"(?i:\d{1,6}(?:[ \t]+[A-Z0-9][A-Z0-9.'-]*){1,4}?[ \t]+(?:" + '|'.join(STREET_SUFFIXES) + r")\b)"),
+    ('CARD', r'\d(?:[ -]?\d){12,18}\b'),
+    ('PHONE', r'\d{10}\b|\d{3}[-.]\d{3}[-.]\d{4}\b'),
+    ('ACCOUNT', r'\d{8,}\b'),
+    ('NAME', r'[A-Z]{2,}[ \t]+[A-Z]{2,}(?:[ \t]+[A-Z]{2,})?\b'),
+)
+# "(555) 123-4567" starts with a non-word character, so it cannot sit behind the shared \b
+AREA_CODE_PHONE = r'\(\d{3}\)[ ]?\d{3}[-.]\d{4}\b'
+
+def _compile(names) -> re.Pattern:
+    branches = '|'.join(f'(?P<{name}>{pattern})' for name, pattern in ENTITY_PATTERNS if name in names)
+    return re.compile(rf'\b(?:{branches})|(?P<PHONE_AREA>{AREA_CODE_PHONE})')
+
+ENTITY_PATTERN = _compile([name for name, _ in ENTITY_PATTERNS])
+# Numeric entities re-checked inside a digit group that failed the card checksum
+NUMERIC_FALLBACK_PATTERN = _compile(['PHONE', 'ACCOUNT'])
+
+ENTITY_NAMES = '|'.join(name for name, _ in ENTITY_PATTERNS)
+PLACEHOLDER_PATTERN = re.compile(rf'\[(?:{ENTITY_NAMES})_\d+\]')
+# What a chunk may end with while the placeholder it starts is still incomplete
+PARTIAL_PLACEHOLDER_PATTERN = re.compile(rf'\[[A-Z]*(?:_\d*)?')
+MAX_PLACEHOLDER_CHARS = max(len(name) for name, _ in ENTITY_PATTERNS) + 12
+
+def luhn_valid(digits: str) -> bool:
+    total = 0
+    for index, char in enumerate(reversed(digits)):
+        value = int(char)
+        if index % 2:
+            value = value * 2 - 9 if value > 4 else value * 2
+        total += value
+    return total % 10 == 0
+
+class TokenMasker:
+    """Replaces PII with numbered placeholders ([PHONE_1], [NAME_2]) and keeps the token map to undo it.
+
+    One instance masks everything that goes into one prompt: a value gets the same placeholder
+    wherever it appears, and placeholders are numbered in order of first appearance, so equal
+    masked prompts (and their cached responses) rehydrate correctly with each transcript's own map.
+    The map only lives in memory; it is rebuilt by masking the stored transcript again.
+    """
+    __slots__ = ('token_map', '_tokens', '_counts')
+
+    def __init__(self):
+        self.token_map: Dict[str, str] = {}  # placeholder -> original text
+        self._tokens: Dict[Tuple[str, str], str] = {}
+        self._counts: Counter = Counter()
+
+    def _placeholder(self, match: re.Match) -> str:
+        entity = 'PHONE' if match.lastgroup == 'PHONE_AREA' else match.lastgroup
+        key = (entity, match.group())
+        token = self._tokens.get(key)
+        if token is None:
+            self._counts[entity] += 1
+            token = self._tokens[key] = f'[{entity}_{self._counts[entity]}]'
+            self.token_map[token] = match.group()
+        return token
+
+    def _replace(self, match: re.Match) -> str:
+        if match.lastgroup == 'CARD':
+            text = match.group()
+            if not luhn_valid(re.sub(r'[ -]', '', text)):
+                # Not a card number; mask whatever phone/account numbers the digit group contains
+                return NUMERIC_FALLBACK_PATTERN.sub(self._placeholder, text)
+        return self._placeholder(match)
+
+    def mask(self, text: str) -> str:
+        """Mask PII in text (single pass), extending the token map."""
+        return ENTITY_PATTERN.sub(self._replace, text)
 
 def mask_sensitive_data(transcript: str) -> str:
-    """Mask PII in transcript for security before LLM/API call."""
-    # Mask phones (10-digit or similar)
-    transcript = re.sub(r'\b\d{10}\b', '[PHONE]', transcript)
-    # Mask names (capitalized words pattern; refine if needed)
-    transcript = re.sub(r'\b[A-Z]{2,}\s+[A-Z]{2,}(\s+[A-Z]{2,})?\b', '[NAME]', transcript)
-    # Mask addresses (refined to require street indicators, avoid timestamps like '1 m 30 s')
-    transcript = re.sub(r'\d+\s+[A-Z0-9\s]+(?:ST|AVE|RD|BLVD|DR|LN|CT|PL|WAY|CIR|STREET|AVENUE|ROAD|BOULEVARD|DRIVE|LANE|COURT|PLACE|WAY|CIRCLE)\b', '[ADDRESS]', transcript, flags=re.I)
-    # Mask accounts/SIDs (8+ digits, but avoid if in timestamp context)
-    transcript = re.sub(r'\b(?! \s*[m s]\b)\d{8,}\b', '[ACCOUNT]', transcript)
-    # Add more patterns as needed (e.g., emails: r'\b[\w\.-]+@[\w\.-]+\.\w+\b' -> '[EMAIL]')
-    return transcript
\ No newline at end of file
+    """Mask PII in transcript for security before LLM/API call (single pass over the text)."""
+    return TokenMasker().mask(transcript)
+
+def unmask(text: str, token_map: Dict[str, str]) -> str:
+    """Put the original values back in place of known placeholders; anything else is left as is."""
+    return PLACEHOLDER_PATTERN.sub(lambda match: token_map.get(match.group(), match.group()), text)
+
+class StreamingUnmasker:
+    """unmask() for text that arrives in chunks, e.g. a streamed completion.
+
+    Every chunk is rehydrated as it comes in; only a tail that could still grow into a placeholder
+    ('... [PHO') is held back until the next chunk (or flush) completes or rules it out.
+    """
+    __slots__ = ('token_map', '_pending')
+
+    def __init__(self, token_map: Dict[str, str]):
+        self.token_map = token_map
+        self._pending = ''
+
+    def feed(self, chunk: str) -> str:
+        text = self._pending + chunk
+        self._pending = ''
+        start = text.rfind('[', max(0, len(text) - MAX_PLACEHOLDER_CHARS))
+        if start != -1 and PARTIAL_PLACEHOLDER_PATTERN.fullmatch(text, start):
+            text, self._pending = text[:start], text[start:]
+        return unmask(text, self.token_map)
+
+    def flush(self) -> str:
+        text, self._pending = self._pending, ''
+        return text
@@ -1,21 +1,126 @@
 import re
-from typing import Optional
+from collections import Counter
+from typing import Any, Dict, Optional, List, Union
+
+TURN_PATTERN = re.compile(r'\(\s*([^)]+)\s*\):\s*([^:]+?):\s*(.*)')
+NON_ALPHA_PATTERN = re.compile(r'[^a-zA-Z]')
+EXCLUDED_SPEAKER_PATTERN = re.compile(r'(customer|user|client|system)', re.I)
+PROVISION_PATTERN = re.compile(r'(customer phone|address:|name on|sid number|case #)')
+UPPER_NAME_PATTERN = re.compile(r'\b[A-Z]{2,}\s+[A-Z]{2,}\b')
+GREETING_PATTERN = re.compile(r'thank you|hello|provide|the customer', re.I)
 
 def parse_timestamp(timestamp_str: str) -> Optional[int]:
     """Parse timestamp formats like '0 s', '1 m 28 s', '120' into seconds."""
     try:
         clean_ts = re.sub(r'[^\d\s m s]', '', timestamp_str).strip()
         parts = re.findall(r'(\d+)\s*(m|s)', clean_ts)
-        
+
         if not parts:
             digits = re.findall(r'\d+', clean_ts)
             if digits:
                 return int(digits[0])
             return None
-        
+
         total = 0
         for num, unit in parts:
             total += int(num) * (60 if unit == 'm' else 1)
         return total
     except:
-        return None
\ No newline at end of file
+        return None
+
+class Turn:
+    """One '( ts ): Speaker: message' line. Role is 'agent', 'system', 'customer' or 'other'."""
+    __slots__ = ('seconds', 'speaker', 'speaker_lower', 'role', 'message', 'lowered', 'hits')
+
+    def __init__(self, seconds: Optional[int], speaker: str, message: str):
+        self.seconds = seconds
+        self.speaker = speaker
+        self.speaker_lower = speaker.lower()
+        self.role = 'other'
+        self.message = message
+        self.lowered = message.lower()
+        self.hits = None  # Detector rule hits, filled lazily by utils.rules.turn_hits
+
+class ParsedTranscript:
+    """Transcript tokenized once: turn records plus the first-agent timing shared by all detectors.
+
+    One parse backs one analysis, so it also carries that analysis' detector memo: results keyed by
+    detector name, with counters of calls and of actual runs.
+    """
+    __slots__ = ('text', 'turns', 'line_count', 'agent_id', 'system_time',
+                 'first_agent_time', 'first_agent_identifier', 'first_agent_message',
+                 'detector_memo', 'detector_calls', 'detector_runs')
+
+    def __init__(self, text: str):
+        self.text = text
+        self.turns: List[Turn] = []
+        self.line_count = 0
+        self.detector_memo: Dict[str, Any] = {}
+        self.detector_calls: Counter = Counter()
+        self.detector_runs: Counter = Counter()
+        alpha_lens = []
+
+        for line in text.split('\n'):
+            line = line.strip()
+            if not line:
+                continue
+            self.line_count += 1
+            match = TURN_PATTERN.match(line)
+            if not match:
+                continue
+            timestamp_str, speaker, message = match.groups()
+            speaker_clean = speaker.strip().rstrip(':')
+            self.turns.append(Turn(parse_timestamp(timestamp_str), speaker_clean, message))
+            alpha_lens.append(len(NON_ALPHA_PATTERN.sub('', speaker_clean)))
+
+        self._identify_agent(alpha_lens)
+
+        for turn, alpha_len in zip(self.turns, alpha_lens):
+            if turn.speaker_lower == self.agent_id or alpha_len == 1:
+                turn.role = 'agent'
+            elif 'system' in turn.speaker_lower:
+                turn.role = 'system'
+            elif alpha_len > 1:
+                turn.role = 'customer'
+
+    def _identify_agent(self, alpha_lens: List[int]) -> None:
+        """Prioritize single-character speakers for agent ID, skipping provision-like messages."""
+        self.system_time = None
+        self.first_agent_time = None
+        self.first_agent_identifier = None
+        self.first_agent_message = None
+
+        for turn, alpha_len in zip(self.turns, alpha_lens):
+            if turn.seconds is None:
+                continue
+
+            if self.system_time is None and 'system' in turn.speaker_lower:
+                self.system_time = turn.seconds
+                continue
+
+            is_excluded = EXCLUDED_SPEAKER_PATTERN.search(turn.speaker_lower)
+            is_long_speaker = alpha_len > 1
+            is_provision_like = (PROVISION_PATTERN.search(turn.lowered) or
+                                 (UPPER_NAME_PATTERN.search(turn.message) and
+                                  not GREETING_PATTERN.search(turn.lowered)))
+
+            if (self.system_time is not None and
+                not is_excluded and not is_long_speaker and not is_provision_like):
+                self.first_agent_time = turn.seconds
+                self.first_agent_identifier = turn.speaker
+                self.first_agent_message = turn.message
+                break
+
+        self.agent_id = self.first_agent_identifier.lower() if self.first_agent_identifier else ''
+
+    @property
+    def response_time_seconds(self) -> Optional[int]:
+        if self.system_time is None or self.first_agent_time is None:
+            return None
+        return self.first_agent_time - self.system_time
+
+def parse_transcript(transcript: Union[str, ParsedTranscript]) -> ParsedTranscript:
+    """Return a ParsedTranscript, parsing raw text only if it has not been parsed yet."""
+    if isinstance(transcript, ParsedTranscript):
+        return transcript
+    return ParsedTranscript(transcript)